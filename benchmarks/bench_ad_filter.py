@@ -0,0 +1,56 @@
+"""Микробенчмарк рекламного фильтра: прежний is_advertisement против
+скомпилированного utils.ad_filter на текущем и на разросшемся списке.
+
+Запуск из корня проекта:  python -m benchmarks.bench_ad_filter
+"""
+
+import random
+import string
+import timeit
+
+from utils.ad_filter import DEFAULT_RULES, compile_rules
+
+
+def legacy_is_advertisement(text: str, bad_words) -> bool:
+    # Реализация из core/news_collector до перехода на utils.ad_filter
+    return any(bad_word.lower() in text.lower() for bad_word in bad_words)
+
+
+def _random_word(rng: random.Random, alphabet: str) -> str:
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(4, 11)))
+
+
+def _make_posts(rng: random.Random, count: int):
+    alphabet = "абвгдежзийклмнопрстуфхцчшщыэюя"
+    posts = []
+    for _ in range(count):
+        words = [_random_word(rng, alphabet) for _ in range(rng.randint(40, 160))]
+        posts.append(" ".join(words).capitalize() + ".")
+    return posts
+
+
+def _bench(label: str, func, posts, repeat: int = 3) -> float:
+    best = min(timeit.repeat(lambda: [func(p) for p in posts], number=1, repeat=repeat))
+    per_post_us = best / len(posts) * 1e6
+    print(f"{label:<40} {best * 1000:9.2f} ms  ({per_post_us:7.2f} µs/пост)")
+    return best
+
+
+def main() -> None:
+    rng = random.Random(42)
+    posts = _make_posts(rng, 300)
+    grown = list(DEFAULT_RULES) + [
+        _random_word(rng, string.ascii_lowercase + "абвгдежзиклмнопрст")
+        for _ in range(3000)
+    ]
+
+    for label, rules in (("текущий список", DEFAULT_RULES), ("3000+ терминов", grown)):
+        print(f"\n— {label}: {len(rules)} правил, {len(posts)} постов")
+        pattern = compile_rules(rules)
+        old = _bench("legacy any(... in text.lower())", lambda t: legacy_is_advertisement(t, rules), posts)
+        new = _bench("compiled trie regex", lambda t: pattern.search(t.lower()) is not None, posts)
+        print(f"{'ускорение':<40} {old / new:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
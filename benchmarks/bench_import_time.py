@@ -0,0 +1,73 @@
+"""Бюджет холодного старта: планировщик запускает main.py в новом
+интерпретаторе на каждый пост, поэтому импорт оплачивается каждый раз.
+
+Замеряет `python -X importtime -c "import main"` (лучший из нескольких
+запусков), печатает самые тяжёлые модули и завершается с кодом 1, если
+импорт дольше бюджета или при импорте подтянулись тяжёлые SDK, которые
+должны загружаться лениво (см. core/clients.py).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_import_time [--budget-ms 200] [--runs 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Эти пакеты должны импортироваться только при первом реальном использовании
+LAZY_PACKAGES = ("telethon", "openai", "PIL", "requests", "numpy", "httpx")
+
+
+def _measure():
+    """Возвращает (общее время импорта main в мкс, {модуль: cumulative мкс})."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{proc.stderr[-2000:]}")
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, cumulative_us, name = line.split("|")
+        modules[name.strip()] = int(cumulative_us)
+    return modules.get("main", 0), modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "200")))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    best_us, modules = None, {}
+    for _ in range(max(1, args.runs)):
+        total_us, mods = _measure()
+        if best_us is None or total_us < best_us:
+            best_us, modules = total_us, mods
+
+    print(f"import main: {best_us / 1000:.1f} ms (бюджет {args.budget_ms:.0f} ms)")
+    print("Самые тяжёлые модули (cumulative):")
+    for name, us in sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[: args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = sorted({n.split(".")[0] for n in modules} & set(LAZY_PACKAGES))
+    if eager:
+        print(f"❌ При импорте загружены пакеты, которые должны быть ленивыми: {', '.join(eager)}")
+        failed = True
+    if best_us / 1000 > args.budget_ms:
+        print("❌ Бюджет холодного старта превышен")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Микробенчмарк отбора фото по тегам: прежние подстрочные
+is_finance_related/has_blacklisted и enrich_query с регуляркой на каждый
+термин против utils.tag_classifier.
+
+Корпус — строки тегов из кэша ответов Pixabay (CACHE_DB_PATH, namespace
+pixabay_search), если он не пуст, иначе синтетическая выдача из типичных
+тегов Pixabay.
+
+Запуск из корня проекта:  python -m benchmarks.bench_tag_classifier
+"""
+
+import json
+import os
+import random
+import re
+import sqlite3
+import timeit
+
+from config.settings import CACHE_DB_PATH
+from utils.tag_classifier import DEFAULT_BLACKLIST, DEFAULT_FINANCE, TagClassifier, get_tag_classifier
+
+# Списки и функции из core/image_generator до перехода на utils.tag_classifier
+LEGACY_WHITELIST = [
+    "finance", "financial", "stock", "stocks", "market", "stock market",
+    "trading", "trader", "chart", "charts", "candlestick", "ticker",
+    "forex", "exchange", "economy", "economic", "bank", "banking",
+    "money", "investment", "invest", "investing", "gold", "oil",
+    "commodity", "commodities", "energy", "currency", "currencies",
+    "wall street", "bull", "bear", "etf",
+]
+LEGACY_BLACKLIST = [
+    "power supply", "psu", "computer", "motherboard", "gpu", "cpu",
+    "cable", "plug", "socket", "server", "electronics",
+    "mushroom", "mushrooms", "forest", "tree", "trees", "leaf", "leaves",
+    "flower", "flowers", "bloom", "mountain", "mountains", "landscape",
+    "river", "lake", "sea", "ocean", "nature", "butterfly", "insect",
+    "animal", "animals", "bird", "birds", "cat", "dog", "doge",
+    "squirrel", "deer", "fox", "horse",
+]
+
+
+def legacy_is_finance_related(text: str, whitelist=LEGACY_WHITELIST) -> bool:
+    t = (text or "").lower()
+    return any(w in t for w in whitelist)
+
+
+def legacy_has_blacklisted(text: str, blacklist=LEGACY_BLACKLIST) -> bool:
+    t = (text or "").lower()
+    return any(b in t for b in blacklist)
+
+
+def legacy_enrich_query(q: str, blacklist=LEGACY_BLACKLIST) -> str:
+    for b in blacklist:
+        q = re.sub(rf"\b{re.escape(b)}\b", "", q, flags=re.IGNORECASE)
+    return q.strip()
+
+
+# Типичные теги выдачи Pixabay по финансовым запросам
+_NOISE = [
+    "business", "office", "city", "people", "man", "woman", "desk", "laptop",
+    "street", "building", "skyscraper", "new york", "night", "light", "red",
+    "blue", "close-up", "hand", "paper", "glass", "industry", "factory",
+    "education", "vacation", "communication", "soil", "toilet", "bullion",
+    "season", "research", "seafood", "digital", "technology", "graph",
+    "concept", "success", "growth", "crisis", "coins", "dollar", "euro",
+]
+
+
+def _synthetic_tags(rng: random.Random, count: int):
+    vocab = list(DEFAULT_FINANCE) + list(DEFAULT_BLACKLIST) + _NOISE * 3
+    return [", ".join(rng.sample(vocab, rng.randint(3, 6))) for _ in range(count)]
+
+
+def _cached_tags():
+    if not os.path.exists(CACHE_DB_PATH):
+        return []
+    conn = sqlite3.connect(CACHE_DB_PATH)
+    try:
+        rows = conn.execute(
+            "SELECT value FROM response_cache WHERE namespace='pixabay_search'"
+        ).fetchall()
+    except sqlite3.Error:
+        return []
+    finally:
+        conn.close()
+    return [hit.get("tags") or "" for (value,) in rows for hit in json.loads(value)]
+
+
+def _bench(label: str, func, items, repeat: int = 5) -> float:
+    best = min(timeit.repeat(lambda: [func(t) for t in items], number=1, repeat=repeat))
+    per_item_us = best / len(items) * 1e6
+    print(f"{label:<44} {best * 1000:9.2f} ms  ({per_item_us:7.2f} µs/шт.)")
+    return best
+
+
+def _random_word(rng: random.Random) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(5, 10)))
+
+
+def _legacy_reason(text: str) -> str:
+    t = (text or "").lower()
+    hit = next((b for b in LEGACY_BLACKLIST if b in t), None)
+    if hit:
+        return f"чёрный список: {hit}"
+    hit = next((w for w in LEGACY_WHITELIST if w in t), None)
+    return f"финансы: {hit}" if hit else "нет терминов"
+
+
+def _new_reason(match) -> str:
+    if match.blocked is not None:
+        return f"чёрный список: {match.blocked}"
+    return "финансы целым словом" if match.finance else "нет терминов целым словом"
+
+
+def _print_disagreements(lines, classifier, examples: int = 3) -> None:
+    """Строки, по которым прежняя и новая проверки решают по-разному, —
+    по группам (причина прежнего решения -> причина нового) с числом
+    строк и примерами. Расхождение не обязательно ошибка прежней
+    проверки: его причина видна в группе.
+    """
+    groups = {}
+    for t in lines:
+        legacy = not legacy_has_blacklisted(t) and legacy_is_finance_related(t)
+        match = classifier.match(t)
+        if legacy == (match.blocked is None and match.score > 0):
+            continue
+        key = (
+            f"{'берёт' if legacy else 'отбрасывает'} ({_legacy_reason(t)})",
+            f"{'отбрасывает' if legacy else 'берёт'} ({_new_reason(match)})",
+        )
+        groups.setdefault(key, []).append(t)
+    total = sum(len(v) for v in groups.values())
+    print(f"\nРешения расходятся для {total} из {len(lines)} строк:")
+    for (old, new), items in sorted(groups.items(), key=lambda kv: -len(kv[1])):
+        print(f"  {len(items):5}  прежде {old} -> теперь {new}")
+        for t in items[:examples]:
+            print(f"         «{t}»")
+
+
+def main() -> None:
+    rng = random.Random(42)
+    tags = _cached_tags()
+    source = "кэш Pixabay"
+    if not tags:
+        tags, source = _synthetic_tags(rng, 2000), "синтетическая выдача"
+    unique = list(dict.fromkeys(tags))
+    queries = [f"{rng.choice(unique).split(',')[0]} {rng.choice(_NOISE)} finance" for _ in range(500)]
+    grown_white = LEGACY_WHITELIST + [_random_word(rng) for _ in range(300)]
+    grown_black = LEGACY_BLACKLIST + [_random_word(rng) for _ in range(300)]
+
+    scenarios = (
+        ("текущие словари", LEGACY_WHITELIST, LEGACY_BLACKLIST, get_tag_classifier()),
+        (
+            "словари +600 терминов",
+            grown_white,
+            grown_black,
+            TagClassifier(dict.fromkeys(grown_white, 1.0), grown_black),
+        ),
+    )
+    for label, white, black, classifier in scenarios:
+        print(f"\n— {label}: {len(white)} + {len(black)} терминов, "
+              f"{len(unique)} уникальных строк тегов ({source})")
+        old = _bench(
+            "legacy any(w in tags) x2",
+            lambda t: legacy_has_blacklisted(t, black) or legacy_is_finance_related(t, white),
+            unique,
+        )
+        # _match — без кэша строк: каждая строка оценивается заново
+        new = _bench("TagClassifier", classifier._match, unique)
+        print(f"{'ускорение':<44} {old / new:9.1f}x")
+        old = _bench("legacy enrich_query (re.sub на термин)", lambda q: legacy_enrich_query(q, black), queries)
+        new = _bench("TagClassifier.strip_blacklisted", classifier.strip_blacklisted, queries)
+        print(f"{'ускорение':<44} {old / new:9.1f}x")
+
+    # Поиск идёт волнами по вариантам запроса: те же фото (и строки тегов)
+    # приходят снова, и повтор отвечает кэш match
+    repeated = unique * 3
+    rng.shuffle(repeated)
+    classifier = get_tag_classifier()
+    classifier.match.cache_clear()
+    print(f"\n— повторная выдача: {len(repeated)} строк, каждая трижды")
+    old = _bench(
+        "legacy any(w in tags) x2",
+        lambda t: legacy_has_blacklisted(t) or legacy_is_finance_related(t),
+        repeated,
+        repeat=1,
+    )
+    new = _bench("TagClassifier.match (с кэшем строк)", classifier.match, repeated, repeat=1)
+    print(f"{'ускорение':<44} {old / new:9.1f}x")
+
+    _print_disagreements(unique, classifier)
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,8 @@ load_dotenv(DOTENV_PATH)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # Telegram
-TELEGRAM_API_ID = int(os.getenv("TELEGRAM_API_ID"))
+# 0 вместо падения при импорте: ошибка всплывёт только при подключении
+TELEGRAM_API_ID = int(os.getenv("TELEGRAM_API_ID") or 0)
 TELEGRAM_API_HASH = os.getenv("TELEGRAM_API_HASH")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHANNEL_ID = os.getenv("TELEGRAM_CHANNEL_ID")
@@ -29,8 +30,92 @@ FREEIMAGE_API_KEY = os.getenv("FREEIMAGE_API_KEY")
 # Unsplash (legacy)
 UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
 
+# News collection (optional)
+# Сколько каналов опрашиваем одновременно (1 = последовательно, как раньше)
+COLLECT_CONCURRENCY = int(os.getenv("COLLECT_CONCURRENCY", "8"))
+# Запрашивать у Telegram только сообщения новее последнего увиденного (min_id)
+COLLECT_INCREMENTAL = os.getenv("COLLECT_INCREMENTAL", "1").lower() in ("1", "true", "yes")
+# Постраничное чтение окна от end_time назад (100 — максимум Telegram на запрос)
+COLLECT_PAGINATE = os.getenv("COLLECT_PAGINATE", "1").lower() in ("1", "true", "yes")
+COLLECT_PAGE_SIZE = int(os.getenv("COLLECT_PAGE_SIZE", "100"))
+COLLECT_MAX_PAGES = int(os.getenv("COLLECT_MAX_PAGES", "20"))
+# Откуда main.py берёт посты: history — запрос истории в момент запуска,
+# buffer — локальная таблица posts, которую наполняет core.stream_collector
+COLLECT_SOURCE = os.getenv("COLLECT_SOURCE", "history").lower()
+# Насколько глубоко stream_collector догружает историю после простоя
+COLLECT_CATCHUP_HOURS = int(os.getenv("COLLECT_CATCHUP_HOURS", "24"))
+# Как часто stream_collector догружает историю и без простоя (обновления
+# приходят только по каналам, где аккаунт состоит)
+COLLECT_CATCHUP_INTERVAL_MINUTES = int(os.getenv("COLLECT_CATCHUP_INTERVAL_MINUTES", "15"))
+# Файл с правилами рекламного фильтра (см. формат в самом файле)
+# Пустое значение в .env — тоже путь по умолчанию
+AD_WORDS_PATH = os.getenv("AD_WORDS_PATH") or str(PROJECT_ROOT / "config" / "ad_words.txt")
+# Почти-дубликаты (SimHash): порог по Хэммингу и глубина истории; LSH-полосы
+# строятся под порог (utils.simhash.band_widths)
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "1").lower() in ("1", "true", "yes")
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "5"))
+NEAR_DUP_HISTORY_HOURS = int(os.getenv("NEAR_DUP_HISTORY_HOURS", "72"))
+# Сколько дней хранить отпечатки обработанных постов в processed
+PROCESSED_TTL_DAYS = int(os.getenv("PROCESSED_TTL_DAYS", "30"))
+
+# Summary (optional)
+# Бюджет входных токенов на один запрос к модели; длинные окна сводятся map-reduce
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "6000"))
+SUMMARY_MAX_PARALLEL = int(os.getenv("SUMMARY_MAX_PARALLEL", "4"))
+# Один запрос с JSON-схемой: пост, описание обложки и теги поиска сразу
+SUMMARY_BUNDLE = os.getenv("SUMMARY_BUNDLE", "0").lower() in ("1", "true", "yes")
+
+# Ranking (optional)
+# Сколько самых информативных постов окна отдавать в сводку (0 — все)
+RANK_TOP_K = int(os.getenv("RANK_TOP_K", "40"))
+# Веса каналов: "markettwits=1.2,moexdiv=0.8"; по умолчанию 1.0
+RANK_CHANNEL_WEIGHTS = os.getenv("RANK_CHANNEL_WEIGHTS", "")
+RANK_RECENCY_HALF_LIFE_HOURS = float(os.getenv("RANK_RECENCY_HALF_LIFE_HOURS", "6"))
+
+# Response cache (optional)
+# Общий SQLite-кэш ответов внешних API (data/cache.db)
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH") or str(PROJECT_ROOT / "data" / "cache.db")
+# Предельный размер кэша; сверх него вытесняются давно не читанные записи
+CACHE_MAX_MB = float(os.getenv("CACHE_MAX_MB", "50"))
+# Кэш ответов OpenAI: повторный запуск режима не платит за те же запросы
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "48"))
+
+# Image search (optional)
+# Сколько вариантов запроса к Pixabay выполняется одновременно
+PIXABAY_MAX_PARALLEL = int(os.getenv("PIXABAY_MAX_PARALLEL", "6"))
+# Поиск останавливается, набрав столько новых подходящих фото
+PIXABAY_MIN_CANDIDATES = int(os.getenv("PIXABAY_MIN_CANDIDATES", "5"))
+# Общий предел времени на поиск обложки (все волны), секунды
+PIXABAY_SEARCH_DEADLINE = float(os.getenv("PIXABAY_SEARCH_DEADLINE", "45"))
+# Кэш ответов поиска Pixabay (условия API просят кэшировать на 24 часа)
+PIXABAY_CACHE_ENABLED = os.getenv("PIXABAY_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+PIXABAY_CACHE_TTL_HOURS = float(os.getenv("PIXABAY_CACHE_TTL_HOURS", "24"))
+# Выбор обложки (core.cover_ranker): сколько последних обложек учитывать
+# в штрафе за повтор темы и сколько лучших фото пробовать при повторе
+COVER_RANK_RECENT = int(os.getenv("COVER_RANK_RECENT", "6"))
+COVER_RANK_TRIES = int(os.getenv("COVER_RANK_TRIES", "3"))
+# Словари тегов для отбора фото: финансовые термины с весами и чёрный список
+IMAGE_TAGS_PATH = os.getenv("IMAGE_TAGS_PATH") or str(PROJECT_ROOT / "config" / "image_tags.txt")
+
+# Cover pool (optional)
+# Заранее подготовленные обложки по темам (core.cover_pool)
+COVER_POOL_ENABLED = os.getenv("COVER_POOL_ENABLED", "1").lower() in ("1", "true", "yes")
+COVER_POOL_PER_THEME = int(os.getenv("COVER_POOL_PER_THEME", "4"))
+COVER_POOL_MAX_MB = float(os.getenv("COVER_POOL_MAX_MB", "150"))
+COVER_POOL_MAX_AGE_DAYS = float(os.getenv("COVER_POOL_MAX_AGE_DAYS", "7"))
+
 # Image retention (optional)
 MAX_COVERS = int(os.getenv("MAX_COVERS", "50"))
+# Бюджет data/covers вместе с рендишенами; сверх него и MAX_COVERS
+# вытесняются давно не публиковавшиеся обложки (core.cover_cache)
+COVERS_DIR_MAX_MB = float(os.getenv("COVERS_DIR_MAX_MB", "200"))
+# Предельный размер скачиваемой обложки; больше — загрузка прерывается
+COVER_MAX_MB = float(os.getenv("COVER_MAX_MB", "15"))
+# Визуальные повторы обложек (dHash): порог по Хэммингу из 64 бит; LSH-полосы
+# индекса строятся под порог (utils.simhash.band_widths)
+COVER_DHASH_ENABLED = os.getenv("COVER_DHASH_ENABLED", "1").lower() in ("1", "true", "yes")
+COVER_DHASH_MAX_DISTANCE = int(os.getenv("COVER_DHASH_MAX_DISTANCE", "6"))
 
 # Pixabay
 # Support both canonical and common lowercase variants in existing .env files
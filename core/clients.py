@@ -0,0 +1,71 @@
+# core/clients.py
+#
+# Общие внешние клиенты. Создаются лениво при первом обращении и
+# переиспользуются всеми модулями: импорт main.py не открывает сессий,
+# соединений и не тянет тяжёлые SDK.
+
+import asyncio
+import os
+import weakref
+from functools import lru_cache
+
+from config.settings import OPENAI_API_KEY, TELEGRAM_API_ID, TELEGRAM_API_HASH
+
+
+SESSION_DIR = os.path.join("sessions")
+
+# Асинхронные клиенты привязаны к циклу событий, в котором открыты их
+# соединения, поэтому кэшируются по циклу (sync-обёртки запускают каждый
+# вызов в своём asyncio.run)
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+# Таймаут async HTTP по умолчанию (у httpx он всего 5 секунд)
+HTTP_TIMEOUT = 30.0
+
+
+@lru_cache(maxsize=1)
+def get_telegram_client():
+    """Клиент Telethon (пользовательская сессия sessions/parser)."""
+    from telethon import TelegramClient
+
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    return TelegramClient(os.path.join(SESSION_DIR, "parser"), TELEGRAM_API_ID, TELEGRAM_API_HASH)
+
+
+def _loop_clients() -> dict:
+    return _async_clients.setdefault(asyncio.get_running_loop(), {})
+
+
+def get_async_openai_client():
+    """AsyncOpenAI для текущего цикла событий."""
+    clients = _loop_clients()
+    if "openai" not in clients:
+        if not OPENAI_API_KEY:
+            raise ValueError("❌ Переменная окружения OPENAI_API_KEY не найдена!")
+        from openai import AsyncOpenAI
+
+        clients["openai"] = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return clients["openai"]
+
+
+def get_async_http_client():
+    """Общий httpx.AsyncClient текущего цикла событий (keep-alive для
+    Pixabay, FreeImage, Telegram Bot API и Graph API).
+    """
+    clients = _loop_clients()
+    if "http" not in clients:
+        import httpx
+
+        clients["http"] = httpx.AsyncClient(timeout=HTTP_TIMEOUT, follow_redirects=True)
+    return clients["http"]
+
+
+async def close_async_clients() -> None:
+    """Закрывает соединения async-клиентов текущего цикла событий."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        try:
+            # httpx.AsyncClient закрывается aclose(), AsyncOpenAI — close()
+            await (getattr(client, "aclose", None) or client.close)()
+        except Exception:
+            pass
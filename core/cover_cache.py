@@ -0,0 +1,192 @@
+# core/cover_cache.py
+#
+# Хранилище обложек data/covers. Размер каждой обложки (оригинал вместе
+# с рендишенами) и время её последней публикации лежат в saved_files
+# (utils.image_registry), поэтому вытеснение не сканирует каталог: после
+# каждой новой обложки удаляются давно не публиковавшиеся, пока
+# хранилище не уложится в MAX_COVERS и COVERS_DIR_MAX_MB. Строки удалённых
+# файлов остаются с отметкой removed_at — хэши и dHash продолжают
+# защищать от повторов.
+#
+# Полная сверка каталога с реестром (файлы, удалённые вручную, обложки
+# без записи, осиротевшие рендишены) — reconcile(), её запускает
+# scheduler.py:  python -m core.cover_cache
+
+import os
+import shutil
+import time
+from typing import Dict, Optional
+
+from config.settings import COVERS_DIR_MAX_MB, MAX_COVERS
+from utils.image_registry import get_image_registry
+from utils.image_tools import RENDITIONS_DIR, file_sha256, rendition_paths
+
+COVERS_DIR = os.path.join("data", "covers")
+
+# Сколько строк реестра читать за раз при вытеснении
+_EVICT_PAGE = 32
+
+
+def _rendition_dir(file_hash: str) -> str:
+    return os.path.dirname(rendition_paths(file_hash)["telegram"])
+
+
+def discard_renditions(file_hash: Optional[str]) -> None:
+    """Удаляет рендишены исходника с данным хэшем."""
+    if file_hash:
+        shutil.rmtree(_rendition_dir(file_hash), ignore_errors=True)
+
+
+def _remove(path: str) -> bool:
+    """Удаляет файл; True, если он был и удалён."""
+    try:
+        os.remove(path)
+    except OSError:
+        return False
+    return True
+
+
+def cover_size(path: str, file_hash: Optional[str]) -> int:
+    """Место, занятое обложкой: оригинал плюс её рендишены."""
+    total = 0
+    paths = [path, *(rendition_paths(file_hash).values() if file_hash else ())]
+    for p in paths:
+        try:
+            total += os.path.getsize(p)
+        except OSError:
+            pass
+    return total
+
+
+def register_cover(path: str, file_hash: str, dhash: Optional[int] = None) -> None:
+    """Учитывает новую обложку (рендишены уже построены) и вытесняет
+    старые сверх бюджета.
+    """
+    get_image_registry().mark_file_saved(
+        path, file_hash=file_hash, dhash=dhash, size=cover_size(path, file_hash)
+    )
+    evict_covers(keep=path)
+
+
+# Сверены ли в этом процессе записи реестра с файлами (см. _drop_missing)
+_checked_missing = False
+
+
+def _drop_missing() -> int:
+    """Отмечает удалёнными записи, чьих файлов нет (их удалила прежняя
+    ротация или пользователь), чтобы они не считались в MAX_COVERS.
+    Проверяются только пути из реестра, раз за процесс. Возвращает число
+    отмеченных.
+    """
+    global _checked_missing
+    if _checked_missing:
+        return 0
+    _checked_missing = True
+    registry = get_image_registry()
+    missing = [e for e in registry.live_files() if not os.path.exists(e.filename)]
+    for entry in missing:
+        discard_renditions(entry.file_hash)
+    registry.tombstone_files([e.filename for e in missing])
+    return len(missing)
+
+
+def evict_covers(keep: Optional[str] = None) -> int:
+    """Удаляет давно не публиковавшиеся обложки (с рендишенами), пока
+    их не больше MAX_COVERS и они занимают не больше COVERS_DIR_MAX_MB.
+    Последняя опубликованная обложка не удаляется никогда. Читает из
+    реестра только вытесняемые строки (и раз за процесс — сверку
+    записей с файлами, _drop_missing). Возвращает число удалённых.
+    """
+    registry = get_image_registry()
+    _drop_missing()
+    count, total = registry.files_usage()
+    budget = int(COVERS_DIR_MAX_MB * 1024 * 1024)
+    victims = []
+    offset = 0
+    while count > 1 and (count > MAX_COVERS or total > budget):
+        page = registry.live_files(_EVICT_PAGE, offset)
+        if not page:
+            break
+        offset += len(page)
+        for entry in page:
+            if count <= 1 or (count <= MAX_COVERS and total <= budget):
+                break
+            if entry.filename == keep:
+                continue
+            victims.append(entry)
+            count -= 1
+            total -= entry.size or 0
+    removed = 0
+    for entry in victims:
+        if _remove(entry.filename):
+            removed += 1
+            print(f"🧹 Удалён старый cover: {entry.filename}")
+        discard_renditions(entry.file_hash)
+    registry.tombstone_files([e.filename for e in victims])
+    return removed
+
+
+def reconcile() -> Dict[str, int]:
+    """Полная сверка data/covers и data/renditions с реестром:
+    - записи без файла получают отметку об удалении;
+    - у записей до учёта места досчитываются размер и время (по mtime);
+    - файлы без записи регистрируются, брошенные загрузки (.part
+      старше часа) удаляются;
+    - рендишены, чей исходник не на диске и не в пуле, удаляются;
+    затем выполняется обычное вытеснение.
+    """
+    registry = get_image_registry()
+    stats = {"missing": 0, "backfilled": 0, "adopted": 0, "renditions": 0}
+    known = set()
+    missing = []
+    for entry in registry.live_files():
+        known.add(entry.filename)
+        if not os.path.exists(entry.filename):
+            missing.append(entry.filename)
+            discard_renditions(entry.file_hash)
+        elif entry.size is None or entry.last_access is None:
+            registry.mark_file_saved(
+                entry.filename,
+                file_hash=entry.file_hash,
+                size=cover_size(entry.filename, entry.file_hash),
+                last_access=os.path.getmtime(entry.filename),
+            )
+            stats["backfilled"] += 1
+    registry.tombstone_files(missing)
+    stats["missing"] = len(missing)
+
+    if os.path.isdir(COVERS_DIR):
+        for name in os.listdir(COVERS_DIR):
+            path = os.path.join(COVERS_DIR, name)
+            if path in known or not os.path.isfile(path):
+                continue
+            if name.endswith(".part"):
+                if os.path.getmtime(path) < time.time() - 3600:
+                    _remove(path)
+                continue
+            file_hash = file_sha256(path)
+            registry.mark_file_saved(
+                path, file_hash=file_hash, size=cover_size(path, file_hash),
+                last_access=os.path.getmtime(path),
+            )
+            stats["adopted"] += 1
+
+    if os.path.isdir(RENDITIONS_DIR):
+        alive = {_rendition_dir(h) for h in registry.live_hashes()}
+        for name in os.listdir(RENDITIONS_DIR):
+            path = os.path.join(RENDITIONS_DIR, name)
+            if path not in alive:
+                shutil.rmtree(path, ignore_errors=True)
+                stats["renditions"] += 1
+
+    stats["evicted"] = evict_covers()
+    return stats
+
+
+if __name__ == "__main__":
+    result = reconcile()
+    count, total = get_image_registry().files_usage()
+    print(
+        f"🧹 Обложки сверены: {count} шт., {total / 1024 / 1024:.1f} МБ; "
+        + ", ".join(f"{k}={v}" for k, v in result.items())
+    )
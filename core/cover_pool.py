@@ -0,0 +1,261 @@
+# core/cover_pool.py
+#
+# Пул заранее подготовленных обложек. Между запусками (задача в
+# scheduler.py или вручную) для каждой темы ищутся, проверяются
+# (финансовые теги, чёрный список, не использовались, не повтор по
+# содержимому и dHash) и скачиваются по COVER_POOL_PER_THEME фото;
+# рендишены для Telegram и Instagram строятся сразу же. При публикации generate_image только
+# выбирает из пула обложку под тему сводки — без GPT и сети.
+#
+# Пополнение:  python -m core.cover_pool [--theme oil ...]
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+from config.settings import (
+    COVER_POOL_PER_THEME,
+    COVER_POOL_MAX_MB,
+    COVER_POOL_MAX_AGE_DAYS,
+    COVER_DHASH_ENABLED,
+    COVER_DHASH_MAX_DISTANCE,
+)
+from core.clients import close_async_clients, get_async_http_client
+from core.cover_cache import COVERS_DIR, register_cover
+from core.cover_ranker import context_words, normalized_words, rank_candidates
+from core.image_generator import (
+    collect_pixabay_candidates,
+    check_repeat,
+    cover_base_name,
+    discard_file,
+    download_image,
+    publish_cover,
+    store_cover,
+)
+from utils.ad_filter import compile_rules
+from utils.image_registry import get_image_registry
+from utils.image_tools import render_renditions
+from utils.ranking import THEME_STEMS
+
+POOL_DIR = os.path.join("data", "cover_pool")
+PROVIDER = "pixabay"
+
+# Темы: правила распознавания в тексте (utils.ranking.THEME_STEMS) и
+# запросы к Pixabay для пополнения
+THEMES: Dict[str, Dict[str, List[str]]] = {
+    "oil": {
+        "rules": THEME_STEMS["oil"],
+        "queries": ["oil barrels", "oil refinery", "oil pump jack", "energy market"],
+    },
+    "gold": {
+        "rules": THEME_STEMS["gold"],
+        "queries": ["gold bars", "gold bullion", "precious metals"],
+    },
+    "central_banks": {
+        "rules": THEME_STEMS["central_banks"],
+        "queries": ["central bank building", "interest rates", "press conference", "federal reserve"],
+    },
+    "equities": {
+        "rules": THEME_STEMS["equities"],
+        "queries": ["stock exchange", "trading floor", "candlestick chart", "stock market"],
+    },
+    "crypto": {
+        "rules": THEME_STEMS["crypto"],
+        "queries": ["bitcoin", "cryptocurrency market", "blockchain"],
+    },
+    "currency": {
+        "rules": THEME_STEMS["currency"],
+        "queries": ["currency exchange", "banknotes", "forex trading"],
+    },
+    # Запасная тема: подходит к любой сводке
+    "general": {
+        "rules": [],
+        "queries": ["financial district", "business newspaper", "wall street", "economy"],
+    },
+}
+
+_patterns: Dict[str, object] = {}
+
+
+def _theme_pattern(theme: str):
+    if theme not in _patterns:
+        _patterns[theme] = compile_rules(THEMES[theme]["rules"])
+    return _patterns[theme]
+
+
+def classify(text: str) -> List[str]:
+    """Темы по убыванию числа совпадений в тексте; "general" — последней."""
+    lowered = (text or "").lower()
+    scores = []
+    for theme in THEMES:
+        pattern = _theme_pattern(theme)
+        hits = len(pattern.findall(lowered)) if pattern is not None else 0
+        if hits:
+            scores.append((hits, theme))
+    ordered = [theme for _, theme in sorted(scores, key=lambda item: -item[0])]
+    return ordered + ["general"]
+
+
+def evict_pool() -> int:
+    """Удаляет из пула устаревшие (старше COVER_POOL_MAX_AGE_DAYS),
+    уже использованные и потерявшие файл записи, затем самые старые —
+    пока пул не уложится в COVER_POOL_MAX_MB. Возвращает число удалённых.
+    Их рендишены убирает core.cover_cache.reconcile.
+    """
+    registry = get_image_registry()
+    entries = registry.pool_entries()
+    if not entries:
+        return 0
+    cutoff = time.time() - COVER_POOL_MAX_AGE_DAYS * 86400
+    unused = registry.filter_unused(PROVIDER, [e.image_id for e in entries])
+    stale = [
+        e for e in entries
+        if e.added_at < cutoff or e.image_id not in unused or not os.path.exists(e.path)
+    ]
+    alive = [e for e in entries if e not in stale]
+    budget = int(COVER_POOL_MAX_MB * 1024 * 1024)
+    total = sum(e.size for e in alive)
+    for entry in alive:  # от старых к новым
+        if total <= budget:
+            break
+        stale.append(entry)
+        total -= entry.size
+    for entry in stale:
+        discard_file(entry.path)
+    registry.pool_remove(PROVIDER, [e.image_id for e in stale])
+    return len(stale)
+
+
+async def _refill_theme(theme: str, want: int, exclude: set) -> int:
+    registry = get_image_registry()
+    queries = THEMES[theme]["queries"]
+    directory = os.path.join(POOL_DIR, theme)
+    os.makedirs(directory, exist_ok=True)
+    # С запасом: часть кандидатов отсеется как повторы
+    found = await collect_pixabay_candidates(queries, min_candidates=want * 2, exclude=exclude)
+    # Лучшие фото темы — первыми; штраф за недавние темы тут не нужен
+    ranked = await asyncio.to_thread(rank_candidates, found, " ".join(queries), {})
+    http = get_async_http_client()
+    added = 0
+    for image_id, hit, variant in ranked:
+        if added >= want:
+            break
+        try:
+            tmp_path, content_hash = await download_image(http, hit["url"], directory)
+        except Exception as e:
+            print(f"⚠️ Пул обложек: не удалось скачать {hit['url']}: {e}")
+            continue
+        repeat, dhash = await asyncio.to_thread(check_repeat, tmp_path, content_hash)
+        if repeat:
+            discard_file(tmp_path)
+            continue
+        path = await asyncio.to_thread(store_cover, tmp_path, os.path.join(directory, image_id))
+        try:
+            # Заранее: при публикации рендишены берутся из кэша
+            await asyncio.to_thread(render_renditions, path, content_hash)
+        except Exception as e:
+            print(f"⚠️ Пул обложек: не удалось подготовить {path}: {e}")
+            discard_file(path)
+            continue
+        await asyncio.to_thread(
+            registry.pool_add,
+            PROVIDER, image_id, theme, path, hit["url"], variant, hit.get("tags") or "",
+            content_hash, dhash, os.path.getsize(path),
+        )
+        exclude.add(image_id)
+        added += 1
+    return added
+
+
+async def refill_pool(themes: Optional[List[str]] = None, per_theme: Optional[int] = None) -> int:
+    """Дополняет пул до per_theme (по умолчанию COVER_POOL_PER_THEME)
+    обложек в каждой теме. Возвращает число добавленных.
+    """
+    per_theme = COVER_POOL_PER_THEME if per_theme is None else per_theme
+    registry = get_image_registry()
+    evicted = await asyncio.to_thread(evict_pool)
+    entries = await asyncio.to_thread(registry.pool_entries)
+    exclude = {e.image_id for e in entries}
+    counts: Dict[str, int] = {}
+    for entry in entries:
+        counts[entry.theme] = counts.get(entry.theme, 0) + 1
+
+    added = 0
+    for theme in themes or list(THEMES):
+        want = per_theme - counts.get(theme, 0)
+        if want <= 0:
+            continue
+        try:
+            n = await _refill_theme(theme, want, exclude)
+        except Exception as e:
+            print(f"⚠️ Пул обложек: ошибка пополнения темы {theme}: {e}")
+            continue
+        print(f"🗂 Пул обложек: {theme} +{n}")
+        added += n
+    # Новые файлы могли вывести пул за бюджет
+    evicted += await asyncio.to_thread(evict_pool)
+    print(f"🗂 Пул обложек пополнен: +{added}, удалено {evicted}")
+    return added
+
+
+def pick_cover(text: str, filename: str = "data/final_cover.jpg") -> Optional[str]:
+    """Берёт из пула обложку под тему текста и публикует её как
+    generate_image (data/covers/<id>.jpg + final_cover.jpg). Внутри темы
+    предпочитаются фото, у которых больше тегов совпадает с текстом
+    (русский текст — через запросы его тем, см.
+    core.cover_ranker.context_words), затем более старые. None, если
+    подходящих обложек в пуле нет.
+    """
+    registry = get_image_registry()
+    wanted = context_words(text)
+    for theme in classify(text):
+        entries = registry.pool_entries(theme)
+        if not entries:
+            continue
+        unused = registry.filter_unused(PROVIDER, [e.image_id for e in entries])
+        ranked = sorted(
+            entries,
+            key=lambda e: -len(wanted & normalized_words(e.tags)),
+        )
+        for entry in ranked:
+            stale = (
+                entry.image_id not in unused
+                or not os.path.exists(entry.path)
+                or registry.has_file_hash(entry.file_hash)
+                or (
+                    COVER_DHASH_ENABLED
+                    and entry.dhash is not None
+                    and registry.find_similar(entry.dhash, COVER_DHASH_MAX_DISTANCE) is not None
+                )
+            )
+            if stale:
+                discard_file(entry.path)
+                registry.pool_remove(PROVIDER, [entry.image_id])
+                continue
+            os.makedirs(COVERS_DIR, exist_ok=True)
+            ext = os.path.splitext(entry.path)[1]
+            unique_name = cover_base_name(entry.image_url) + ext
+            os.replace(entry.path, unique_name)
+            registry.pool_remove(PROVIDER, [entry.image_id])
+            registry.mark_used(PROVIDER, entry.image_id, entry.image_url, entry.query)
+            publish_cover(unique_name, filename, entry.file_hash)
+            register_cover(unique_name, entry.file_hash, entry.dhash)
+            print(f"🗂 Обложка из пула ({theme}): {unique_name}")
+            return unique_name
+    return None
+
+
+async def _main(themes: Optional[List[str]]) -> None:
+    try:
+        await refill_pool(themes)
+    finally:
+        await close_async_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пополнение пула обложек")
+    parser.add_argument("--theme", action="append", choices=list(THEMES), help="Только эти темы")
+    args = parser.parse_args()
+    asyncio.run(_main(args.theme))
@@ -0,0 +1,160 @@
+# core/cover_ranker.py
+#
+# Выбор обложки среди найденных на Pixabay фото: вместо случайного
+# кандидата все фото волны поиска оцениваются одним векторным проходом,
+# и пробуются лучшие по порядку.
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config.settings import COVER_RANK_RECENT
+from utils.image_registry import get_image_registry
+from utils.ranking import COVER_WEIGHTS, MIN_TERM_LEN, unit, weighted_sum, words
+
+# Короткая сторона, которой хватает всем рендишенам (utils.image_tools)
+TARGET_SIDE = 1080
+
+# Служебные слова промпта совпадением не считаются
+_STOP_WORDS = frozenset({
+    "the", "and", "with", "for", "from", "into", "over", "photo", "image",
+    "picture", "background", "realistic", "style", "view", "shot",
+})
+
+
+def normalized_words(text: str) -> set:
+    """Слова текста (тегов) для сравнения с context_words: единственное и
+    множественное число совпадают.
+    """
+    return {
+        w[:-1] if len(w) > MIN_TERM_LEN and w.endswith("s") else w
+        for w in words(text)
+    }
+
+
+def recent_themes(limit: int = COVER_RANK_RECENT) -> Dict[str, float]:
+    """Доли тем (core.cover_pool.THEMES, кроме general) среди последних
+    limit обложек — по запросам, которыми они были найдены.
+    """
+    # Ленивый импорт: cover_pool сам строится на core.image_generator
+    from core.cover_pool import classify
+
+    queries = get_image_registry().recent_queries("pixabay", limit)
+    if not queries:
+        return {}
+    counts: Dict[str, int] = {}
+    for query in queries:
+        theme = classify(query)[0]
+        if theme != "general":
+            counts[theme] = counts.get(theme, 0) + 1
+    return {theme: count / len(queries) for theme, count in counts.items()}
+
+
+def context_words(context: str) -> set:
+    """Слова контекста, с которыми сверяются английские теги Pixabay.
+    Промпт обложки обычно русский: его слова с тегами не совпадут,
+    поэтому по основам тем (core.cover_pool.THEMES, русским и
+    английским) находятся темы текста и добавляются слова их запросов
+    ("нефть" -> oil, barrel, refinery ...).
+    """
+    from core.cover_pool import THEMES, classify
+
+    wanted = set(normalized_words(context))
+    for theme in classify(context):
+        for query in THEMES[theme]["queries"] if theme != "general" else ():
+            wanted |= normalized_words(query)
+    return {w for w in wanted if len(w) >= MIN_TERM_LEN and w not in _STOP_WORDS}
+
+
+def score_candidates(
+    hits: Sequence[dict],
+    context: str = "",
+    theme_share: Optional[Dict[str, float]] = None,
+):
+    """Оценки фото (numpy-массив той же длины). hits — компактные hit'ы
+    Pixabay (tags, relevance, likes, downloads, width, height).
+
+    Складывается из:
+      - оценки финансовых тегов (relevance из _filter_hits);
+      - доли тегов, встречающихся в context (промпт обложки и поисковые
+        фразы, см. context_words), с поправкой на длину списка тегов;
+      - популярности: логарифмы лайков и скачиваний;
+      - разрешения: короткая сторона относительно TARGET_SIDE;
+    минус штраф за тему фото пропорционально её доле среди недавних
+    обложек; веса — utils.ranking.COVER_WEIGHTS.
+    """
+    import numpy as np
+
+    n = len(hits)
+    if n == 0:
+        return np.zeros(0)
+
+    # Слова тегов всех фото — словарь уникальных слов и координаты
+    # (фото, слово); совпадения с контекстом считаются одним bincount
+    wanted = context_words(context)
+    vocab: Dict[str, int] = {}
+    doc_ids: List[int] = []
+    word_ids: List[int] = []
+    for i, hit in enumerate(hits):
+        for word in normalized_words(hit.get("tags")):
+            word_ids.append(vocab.setdefault(word, len(vocab)))
+            doc_ids.append(i)
+    in_context = np.zeros(len(vocab))
+    for word, idx in vocab.items():
+        if word in wanted:
+            in_context[idx] = 1.0
+    docs = np.asarray(doc_ids, dtype=np.int64)
+    tag_words = np.asarray(word_ids, dtype=np.int64)
+    matched = np.bincount(docs, weights=in_context[tag_words], minlength=n)
+    lengths = np.bincount(docs, minlength=n)
+    context_score = unit(matched / np.sqrt(np.maximum(lengths, 1)))
+
+    stats = np.array(
+        [
+            [
+                hit.get("relevance") or 0.0,
+                hit.get("likes") or 0,
+                hit.get("downloads") or 0,
+                min(hit.get("width") or 0, hit.get("height") or 0),
+            ]
+            for hit in hits
+        ],
+        dtype=float,
+    )
+    tags_score = unit(stats[:, 0])
+    popularity = 0.5 * (unit(np.log1p(stats[:, 1])) + unit(np.log1p(stats[:, 2])))
+    resolution = np.clip(stats[:, 3] / TARGET_SIDE, 0.0, 1.0)
+
+    penalty = np.zeros(n)
+    if theme_share:
+        from core.cover_pool import classify
+
+        penalty = np.array([theme_share.get(classify(hit.get("tags") or "")[0], 0.0) for hit in hits])
+
+    return weighted_sum(COVER_WEIGHTS, {
+        "tags": tags_score,
+        "context": context_score,
+        "popularity": popularity,
+        "resolution": resolution,
+        "theme": penalty,
+    })
+
+
+def rank_candidates(
+    found: Dict[str, tuple],
+    context: str = "",
+    theme_share: Optional[Dict[str, float]] = None,
+) -> List[Tuple[str, dict, str]]:
+    """Кандидаты collect_pixabay_candidates ({image_id: (hit, вариант)})
+    от лучшего к худшему: [(image_id, hit, вариант)]. theme_share по
+    умолчанию — recent_themes().
+    """
+    if not found:
+        return []
+    import numpy as np
+
+    items = list(found.items())
+    if theme_share is None:
+        theme_share = recent_themes()
+    scores = score_candidates([hit for _, (hit, _) in items], context, theme_share)
+    # Устойчивая сортировка: при равной оценке — порядок выдачи Pixabay
+    order = np.argsort(-scores, kind="stable")
+    return [(items[i][0], items[i][1][0], items[i][1][1]) for i in order]
@@ -1,17 +1,12 @@
-import os
-import requests
+import asyncio
 from pathlib import Path
 
-from dotenv import load_dotenv
-from config.settings import PROJECT_ROOT  # ensure same .env loading behavior
+# config.settings loads .env from the project root (cron safety)
+from config.settings import FREEIMAGE_API_KEY
+from core.clients import get_async_http_client
 
-# Explicitly load .env from project root for cron safety
-load_dotenv(PROJECT_ROOT / ".env")
 
-FREEIMAGE_API_KEY = os.getenv("FREEIMAGE_API_KEY")
-
-
-def upload_to_freeimage(image_path: str) -> str:
+async def upload_to_freeimage_async(image_path: str) -> str:
     """
     Загружает изображение на https://freeimage.host и возвращает прямую ссылку.
     """
@@ -28,14 +23,14 @@ def upload_to_freeimage(image_path: str) -> str:
 
     api_url = "https://freeimage.host/api/1/upload"
 
-    with open(image_path, "rb") as f:
-        files = {"source": f}
-        data = {
-            "key": FREEIMAGE_API_KEY,
-            "action": "upload",
-            "format": "json"
-        }
-        response = requests.post(api_url, files=files, data=data)
+    content = await asyncio.to_thread(Path(image_path).read_bytes)
+    files = {"source": (Path(image_path).name, content)}
+    data = {
+        "key": FREEIMAGE_API_KEY,
+        "action": "upload",
+        "format": "json"
+    }
+    response = await get_async_http_client().post(api_url, files=files, data=data, timeout=60)
 
     if response.status_code == 200:
         json_data = response.json()
@@ -51,3 +46,7 @@ def upload_to_freeimage(image_path: str) -> str:
         raise Exception(
             f"❌ Ошибка загрузки на хостинг: {response.text}"
         )
+
+
+def upload_to_freeimage(image_path: str) -> str:
+    return asyncio.run(upload_to_freeimage_async(image_path))
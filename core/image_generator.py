@@ -1,25 +1,42 @@
+import asyncio
+import hashlib
+import json
 import os
 import re
 import random
-from typing import Optional, List
-
-import requests
-from io import BytesIO
-from PIL import Image
-from openai import OpenAI
-
-from config.settings import OPENAI_API_KEY, PIXABAY_API_KEY, MAX_COVERS
+import shutil
+import tempfile
+from typing import Dict, Iterable, List, Optional
+
+from config.settings import (
+    PIXABAY_API_KEY,
+    COVER_MAX_MB,
+    COVER_DHASH_ENABLED,
+    COVER_DHASH_MAX_DISTANCE,
+    COVER_POOL_ENABLED,
+    PIXABAY_MAX_PARALLEL,
+    PIXABAY_MIN_CANDIDATES,
+    PIXABAY_SEARCH_DEADLINE,
+    PIXABAY_CACHE_ENABLED,
+    PIXABAY_CACHE_TTL_HOURS,
+    COVER_RANK_TRIES,
+)
+from core.clients import get_async_http_client
+from core.cover_cache import COVERS_DIR, register_cover
+from core.cover_ranker import rank_candidates
+from core.llm_cache import chat_completion_async
 from utils.image_registry import (
-    is_used,
+    filter_unused,
     mark_used,
-    is_file_saved,
-    mark_file_saved,
     has_file_hash,
+    find_similar,
 )
+from utils.image_tools import render_renditions
+from utils.phash import dhash_file
+from utils.tag_classifier import get_tag_classifier
+from utils.response_cache import cache_get, cache_put, make_key
 
-
-# Клиент OpenAI для генерации поисковых запросов
-client = OpenAI(api_key=OPENAI_API_KEY)
+PIXABAY_CACHE_NAMESPACE = "pixabay_search"
 
 
 def sanitize_query(q: str) -> str:
@@ -32,50 +49,23 @@ def sanitize_query(q: str) -> str:
     return q
 
 
-# Тематические фильтры
-FINANCE_WHITELIST = [
-    # ключевые финансово-рыночные термины
-    "finance", "financial", "stock", "stocks", "market", "stock market",
-    "trading", "trader", "chart", "charts", "candlestick", "ticker",
-    "forex", "exchange", "economy", "economic", "bank", "banking",
-    "money", "investment", "invest", "investing", "gold", "oil",
-    "commodity", "commodities", "energy", "currency", "currencies",
-    "wall street", "bull", "bear", "etf"
-]
-
-# Расширяем чёрный список: железо + природа/грибы/животные, чтобы отсечь нерелевант
-BLACKLIST = [
-    # железо / IT
-    "power supply", "psu", "computer", "motherboard", "gpu", "cpu",
-    "cable", "plug", "socket", "server", "electronics",
-    # природа и отвлекающие темы
-    "mushroom", "mushrooms", "forest", "tree", "trees", "leaf", "leaves",
-    "flower", "flowers", "bloom", "mountain", "mountains", "landscape",
-    "river", "lake", "sea", "ocean", "nature", "butterfly", "insect",
-    "animal", "animals", "bird", "birds", "cat", "dog", "doge",
-    "squirrel", "deer", "fox", "horse",
-]
-
+# Тематические фильтры: словари в config/image_tags.txt (IMAGE_TAGS_PATH)
 
 def is_finance_related(text: str) -> bool:
-    """Проверяем, присутствует ли ХОТЯ БЫ один финансовый термин.
-    Используем подстрочное включение (Pixabay tags идут через запятую).
+    """Есть ли в тегах ХОТЯ БЫ один финансовый термин (целым словом или
+    фразой, см. utils.tag_classifier).
     """
-    t = (text or "").lower()
-    return any(w in t for w in FINANCE_WHITELIST)
+    return get_tag_classifier().match(text or "").score > 0
 
 
 def has_blacklisted(text: str) -> bool:
-    t = (text or "").lower()
-    return any(b in t for b in BLACKLIST)
+    return get_tag_classifier().match(text or "").blocked is not None
 
 
 def enrich_query(q: str) -> str:
     q = sanitize_query(q)
-    # Убираем явные "железные" термины
-    for b in BLACKLIST:
-        q = re.sub(rf"\b{re.escape(b)}\b", "", q, flags=re.IGNORECASE)
-    q = q.strip()
+    # Убираем явные "железные" и прочие нерелевантные термины
+    q = get_tag_classifier().strip_blacklisted(q)
     # Добавим якорь тематики, если не хватает
     # НЕ добавляем автоматически "stock market" если вообще нет финансовых терминов:
     # вместо этого позволим фильтру позже отклонить нерелевант.
@@ -83,12 +73,13 @@ def enrich_query(q: str) -> str:
     return q
 
 
-def generate_search_query(summary: str) -> str:
+async def generate_search_query_async(summary: str) -> str:
     """Сгенерировать короткий англ. запрос (1-3 слова) под фото на тему
     финансов/рынков; с последующим обогащением и чисткой.
     """
     try:
-        resp = client.chat.completions.create(
+        content = await chat_completion_async(
+            "search_query",
             model="gpt-3.5-turbo",
             temperature=0.3,
             messages=[
@@ -109,7 +100,7 @@ def generate_search_query(summary: str) -> str:
                 {"role": "user", "content": summary},
             ],
         )
-        query = enrich_query(resp.choices[0].message.content or "")
+        query = enrich_query(content)
         print("Поисковый запрос: " + query)
         return query or "finance business"
     except Exception as exc:
@@ -117,18 +108,44 @@ def generate_search_query(summary: str) -> str:
     return "finance business"
 
 
+def generate_search_query(summary: str) -> str:
+    return asyncio.run(generate_search_query_async(summary))
+
+
 """
 Оставлена только интеграция с Pixabay. Путь Pexels удалён.
 Расширена генерация: поддержка нескольких базовых запросов от GPT.
 """
 
 
-def generate_search_candidates(summary: str) -> List[str]:
+def clean_candidates(parts) -> List[str]:
+    """Чистит список поисковых фраз: маркеры, "железные" термины,
+    повторы; не больше 10 фраз.
+    """
+    clean = []
+    seen = set()
+    for p in parts:
+        q = sanitize_query(p if isinstance(p, str) else "")
+        if not q:
+            continue
+        q = enrich_query(q)
+        k = q.lower()
+        if not k or k in seen:
+            continue
+        seen.add(k)
+        clean.append(q)
+        if len(clean) >= 10:
+            break
+    return clean
+
+
+async def generate_search_candidates_async(summary: str) -> List[str]:
     """Возвращает 5-10 коротких англ. запросов (тегов) на основе сводки.
     Пример ответа GPT: "trading floor, candlestick chart, stock exchange, financial district, bull and bear, gold bars, oil barrels, central bank, press conference".
     """
     try:
-        resp = client.chat.completions.create(
+        raw = await chat_completion_async(
+            "search_candidates",
             model="gpt-3.5-turbo",
             temperature=0.4,
             messages=[
@@ -144,23 +161,8 @@ def generate_search_candidates(summary: str) -> List[str]:
                 {"role": "user", "content": summary},
             ],
         )
-        raw = resp.choices[0].message.content or ""
         # Разделим по запятым/строкам
-        parts = re.split(r"[,\n]+", raw)
-        clean = []
-        seen = set()
-        for p in parts:
-            q = sanitize_query(p)
-            if not q:
-                continue
-            q = enrich_query(q)
-            k = q.lower()
-            if k in seen:
-                continue
-            seen.add(k)
-            clean.append(q)
-            if len(clean) >= 10:
-                break
+        clean = clean_candidates(re.split(r"[,\n]+", raw))
         # Если ничего не вышло — подстрахуемся базой
         if not clean:
             clean = ["trading floor", "stock market", "candlestick chart", "financial district", "stock exchange building"]
@@ -170,6 +172,10 @@ def generate_search_candidates(summary: str) -> List[str]:
         return ["trading floor", "stock market", "candlestick chart", "banking"]
 
 
+def generate_search_candidates(summary: str) -> List[str]:
+    return asyncio.run(generate_search_candidates_async(summary))
+
+
 def _expand_query_variants(base: str) -> list:
     base = enrich_query(base)
     extras = [
@@ -207,204 +213,462 @@ def _expand_query_variants(base: str) -> list:
     return uniq[:10]
 
 
-def search_pixabay_image(query) -> str:
-    """Ищет изображение на Pixabay и возвращает прямой URL.
-    Улучшено: собираем все новые подходящие изображения и случайно
-    выбираем одно, чтобы снизить повторяемость.
+def _filter_hits(hits: list):
+    """Новые (не использованные ранее) фото с финансовыми тегами:
+    ([компактные hit'ы с оценкой тегов relevance], сколько пропущено как
+    использованные).
     """
-    try:
-        if not (PIXABAY_API_KEY and PIXABAY_API_KEY.strip()):
-            raise RuntimeError("PIXABAY_API_KEY is missing. Set it in .env")
-        url = "https://pixabay.com/api/"
-        params = {
-            "key": PIXABAY_API_KEY or "",
-            # q зададим ниже по вариантам
-            "image_type": "photo",
-            "orientation": "all",
-            "safesearch": "true",
-            "per_page": 30,
-            "order": "popular",
-            "lang": "en",
-            "category": "business",  # сузим выдачу к бизнес/финансам
+    candidates = []
+    used_skipped = 0
+    classifier = get_tag_classifier()
+    # Вся страница выдачи сверяется с реестром одним запросом
+    unused = filter_unused("pixabay", [h.get("id") for h in hits])
+    for h in hits:
+        image_id = str(h.get("id"))
+        if image_id not in unused:
+            used_skipped += 1
+            continue
+        tags = h.get("tags") or ""
+        # Применяем более строгий фильтр: теги САМИ должны содержать фин. термины
+        # (не засчитываем добавленные слова из variant).
+        match = classifier.match(tags)
+        if match.blocked is not None:
+            continue
+        if match.score <= 0:
+            # Попробуем также описание через сочетание title-like полей если есть
+            # (в API есть 'tags' только, поэтому просто логируем пропуск)
+            print(f"⏭️  Пропуск: нет финансовых тегов -> {tags[:80]}")
+            continue
+        if h.get("url"):
+            candidates.append({**h, "relevance": match.score})
+    return candidates, used_skipped
+
+
+def _compact_hits(hits: list) -> list:
+    """Только нужные отбору поля ответа Pixabay (так они и кэшируются)."""
+    return [
+        {
+            "id": h.get("id"),
+            "tags": h.get("tags") or "",
+            "url": h.get("largeImageURL") or h.get("webformatURL") or h.get("previewURL"),
+            "preview": h.get("previewURL"),
+            "likes": h.get("likes") or 0,
+            "downloads": h.get("downloads") or 0,
+            "width": h.get("imageWidth") or 0,
+            "height": h.get("imageHeight") or 0,
         }
-        base_list: List[str]
-        if isinstance(query, (list, tuple)):
-            base_list = list(query)
+        for h in hits
+    ]
+
+
+def _load_cached_hits(key: str) -> Optional[list]:
+    try:
+        raw = cache_get(PIXABAY_CACHE_NAMESPACE, key)
+    except Exception as e:
+        print(f"⚠️ Кэш Pixabay недоступен: {e}")
+        return None
+    return json.loads(raw) if raw is not None else None
+
+
+def _store_cached_hits(key: str, hits: list) -> None:
+    try:
+        cache_put(
+            PIXABAY_CACHE_NAMESPACE,
+            key,
+            json.dumps(hits, ensure_ascii=False, separators=(",", ":")),
+            PIXABAY_CACHE_TTL_HOURS * 3600,
+        )
+    except Exception as e:
+        print(f"⚠️ Не удалось сохранить ответ Pixabay в кэш: {e}")
+
+
+async def collect_pixabay_candidates(
+    query,
+    deadline: Optional[float] = None,
+    min_candidates: Optional[int] = None,
+    exclude: Iterable[str] = (),
+) -> Dict[str, tuple]:
+    """Собирает новые подходящие фото Pixabay по вариантам запроса:
+    {image_id: (компактный hit, вариант запроса)}. Останавливается, набрав
+    min_candidates (по умолчанию PIXABAY_MIN_CANDIDATES) или к deadline
+    (момент loop.time(), по умолчанию через PIXABAY_SEARCH_DEADLINE секунд).
+    exclude — id, которые не нужны (например, уже лежат в пуле обложек).
+    """
+    if not (PIXABAY_API_KEY and PIXABAY_API_KEY.strip()):
+        raise RuntimeError("PIXABAY_API_KEY is missing. Set it in .env")
+    url = "https://pixabay.com/api/"
+    params = {
+        "key": PIXABAY_API_KEY or "",
+        # q зададим ниже по вариантам
+        "image_type": "photo",
+        "orientation": "all",
+        "safesearch": "true",
+        "per_page": 30,
+        "order": "popular",
+        "lang": "en",
+        "category": "business",  # сузим выдачу к бизнес/финансам
+    }
+    base_list: List[str]
+    if isinstance(query, (list, tuple)):
+        base_list = list(query)
+    else:
+        base_list = [str(query)]
+
+    # Сформируем общий пул вариантов на основе всех базовых запросов
+    variants: List[str] = []
+    for base in base_list:
+        variants.extend(_expand_query_variants(base))
+    # Добавим слегка зашумлённые варианты
+    rand_suffix = ["global markets", "economy", "wall street", "business"]
+    for b in base_list[:3]:
+        for s in rand_suffix:
+            v = enrich_query(f"{b} {s}")[:80]
+            if v.lower() not in [x.lower() for x in variants]:
+                variants.append(v)
+
+    loop = asyncio.get_running_loop()
+    if deadline is None:
+        deadline = loop.time() + PIXABAY_SEARCH_DEADLINE
+    http = get_async_http_client()
+    semaphore = asyncio.Semaphore(max(1, PIXABAY_MAX_PARALLEL))
+
+    cache_hits = 0
+
+    async def fetch_variant(idx: int, variant: str):
+        nonlocal cache_hits
+        # Pixabay не различает регистр: нормализуем q, чтобы варианты
+        # вроде "Stock market" и "stock  market" делили одну запись кэша
+        pv = {**params, "q": " ".join(variant.lower().split())}
+        key = make_key({k: v for k, v in pv.items() if k != "key"})
+        hits = None
+        if PIXABAY_CACHE_ENABLED:
+            hits = await asyncio.to_thread(_load_cached_hits, key)
+        if hits is not None:
+            cache_hits += 1
         else:
-            base_list = [str(query)]
-
-        # Сформируем общий пул вариантов на основе всех базовых запросов
-        variants: List[str] = []
-        for base in base_list:
-            variants.extend(_expand_query_variants(base))
-        # Добавим слегка зашумлённые варианты
-        rand_suffix = ["global markets", "economy", "wall street", "business"]
-        for b in base_list[:3]:
-            for s in rand_suffix:
-                v = enrich_query(f"{b} {s}")[:80]
-                if v.lower() not in [x.lower() for x in variants]:
-                    variants.append(v)
-
-        total_used_skipped = 0
-        for idx, variant in enumerate(variants, 1):
-            pv = {**params, "q": variant}
+            async with semaphore:
+                timeout = min(20.0, deadline - loop.time())
+                if timeout <= 0:
+                    return idx, variant, [], 0
+                # Битый JSON или неожиданная структура ответа — как ошибка
+                # запроса: вариант без фото, в кэш не попадает
+                try:
+                    resp = await http.get(url, params=pv, timeout=timeout)
+                    resp.raise_for_status()
+                    hits = _compact_hits(resp.json().get("hits") or [])
+                except Exception as e:
+                    print(f"⚠️ Ошибка запроса Pixabay (вариант {idx}/{len(variants)}: '{variant}'): {e}")
+                    return idx, variant, [], 0
+            if PIXABAY_CACHE_ENABLED:
+                await asyncio.to_thread(_store_cached_hits, key, hits)
+        # Проверки по реестру — синхронный sqlite, уводим из цикла событий
+        candidates, used_skipped = await asyncio.to_thread(_filter_hits, hits)
+        return idx, variant, candidates, used_skipped
+
+    # Варианты запрашиваются параллельно (не больше PIXABAY_MAX_PARALLEL
+    # сразу); как только набрано PIXABAY_MIN_CANDIDATES новых фото или
+    # вышло время, оставшиеся запросы отменяются
+    tasks = [
+        asyncio.create_task(fetch_variant(idx, variant))
+        for idx, variant in enumerate(variants, 1)
+    ]
+    min_candidates = PIXABAY_MIN_CANDIDATES if min_candidates is None else min_candidates
+    exclude = set(exclude)
+    found = {}  # image_id -> (hit, variant)
+    total_used_skipped = 0
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=max(0.0, deadline - loop.time())):
             try:
-                resp = requests.get(url, params=pv, timeout=20)
-                resp.raise_for_status()
-            except Exception as e:
-                print(f"⚠️ Ошибка запроса Pixabay (вариант {idx}/{len(variants)}: '{variant}'): {e}")
-                continue
-            data = resp.json()
-            hits = data.get("hits") or []
-            candidates = []
-            used_skipped = 0
-            for h in hits:
-                image_id = str(h.get("id"))
-                if image_id and is_used("pixabay", image_id):
-                    used_skipped += 1
-                    continue
-                tags = h.get("tags") or ""
-                # Применяем более строгий фильтр: теги САМИ должны содержать фин. термины
-                # (не засчитываем добавленные слова из variant).
-                if has_blacklisted(tags):
-                    continue
-                if not is_finance_related(tags):
-                    # Попробуем также описание через сочетание title-like полей если есть
-                    # (в API есть 'tags' только, поэтому просто логируем пропуск)
-                    print(f"⏭️  Пропуск: нет финансовых тегов -> {tags[:80]}")
-                    continue
-                image_url = (
-                    h.get("largeImageURL")
-                    or h.get("webformatURL")
-                    or h.get("previewURL")
-                )
-                if image_url:
-                    candidates.append((image_id, image_url))
+                idx, variant, candidates, used_skipped = await next_done
+            except asyncio.TimeoutError:
+                print(f"⏱️ Pixabay: истёк лимит времени поиска ({PIXABAY_SEARCH_DEADLINE:.0f} с)")
+                break
             total_used_skipped += used_skipped
-            if candidates:
-                random.shuffle(candidates)
-                image_id, image_url = candidates[0]
-                print(
-                    f"Найдено изображение (Pixabay): {image_url} | вариант запроса {idx}/{len(variants)} '{variant}', кандидатов: {len(candidates)}, пропущено ранее использованных: {used_skipped}, суммарно пропущено: {total_used_skipped}"
-                )
-                mark_used("pixabay", image_id or "", image_url, variant)
-                return image_url
-            else:
+            if not candidates:
                 print(f"Вариант '{variant}' не дал новых изображений (used skipped={used_skipped}).")
-        print(
-            f"Pixabay: не найдено новых изображений. Всего пропущено уже использованных: {total_used_skipped}."
-        )
+                continue
+            for hit in candidates:
+                if str(hit["id"]) not in exclude:
+                    found.setdefault(str(hit["id"]), (hit, variant))
+            if len(found) >= min_candidates:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+    print(
+        f"Pixabay: кандидатов {len(found)}, пропущено ранее использованных: {total_used_skipped}, ответов из кэша: {cache_hits}"
+    )
+    return found
+
+
+async def rank_pixabay_candidates_async(
+    query, context: str = "", deadline: Optional[float] = None
+) -> List[tuple]:
+    """Одна волна поиска на Pixabay: новые подходящие фото от лучшего к
+    худшему по core.cover_ranker — [(image_id, hit, вариант запроса)].
+    context — текст, с которым сверяются теги (промпт обложки, поисковые
+    фразы). RuntimeError, если подходящих фото нет.
+    """
+    found = await collect_pixabay_candidates(query, deadline)
+    if not found:
+        print("Pixabay: не найдено новых изображений.")
         raise RuntimeError("No suitable Pixabay images found for query (all variants exhausted)")
+    # Оценка — numpy и чтение реестра (недавние темы), вне цикла событий
+    return await asyncio.to_thread(rank_candidates, found, context)
+
+
+async def search_pixabay_image_async(query, deadline: Optional[float] = None, context: str = "") -> str:
+    """Ищет изображение на Pixabay и возвращает прямой URL лучшего по
+    оценке core.cover_ranker фото; оно сразу отмечается использованным.
+    """
+    try:
+        ranked = await rank_pixabay_candidates_async(query, context, deadline)
+        image_id, hit, variant = ranked[0]
+        image_url = hit["url"]
+        print(f"Найдено изображение (Pixabay): {image_url} | вариант запроса '{variant}'")
+        await asyncio.to_thread(mark_used, "pixabay", image_id or "", image_url, variant)
+        return image_url
     except Exception as exc:
         print(f"Ошибка поиска в Pixabay: {exc}")
         raise
 
 
-def generate_image(
-    prompt: str, filename: str = "data/final_cover.png"
+def search_pixabay_image(query) -> str:
+    return asyncio.run(search_pixabay_image_async(query))
+
+
+def _cover_id(image_url: str) -> str:
+    # Извлечём id из URL (хэш/числа перед _<size> .jpg/.jpeg/.png)
+    match = re.search(r"/get/([^/_]+)_\d+\.(?:jpg|jpeg|png)$", image_url, re.IGNORECASE)
+    if match:
+        return match.group(1)
+    # Фолбэк: хэш URL, чтобы гарантировать уникальность
+    return hashlib.sha1(image_url.encode("utf-8")).hexdigest()[:40]
+
+
+def cover_base_name(image_url: str) -> str:
+    """Путь обложки в data/covers без расширения (его даёт store_cover).
+    Один для поиска и для пула: то же фото получает то же имя и ту же
+    запись в реестре, каким бы путём оно ни пришло.
+    """
+    return os.path.join(COVERS_DIR, _cover_id(image_url))
+
+
+async def download_image(http, image_url: str, directory: str = COVERS_DIR) -> tuple:
+    """Потоковая загрузка во временный файл в directory с подсчётом
+    SHA-256 на лету. Прерывается, если ответ не изображение или больше
+    COVER_MAX_MB. Возвращает (путь к временному файлу, sha256).
+    """
+    max_bytes = int(COVER_MAX_MB * 1024 * 1024)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async with http.stream("GET", image_url, timeout=30) as resp:
+                resp.raise_for_status()
+                content_type = resp.headers.get("content-type", "")
+                if not content_type.startswith("image/"):
+                    raise ValueError(f"Неожиданный content-type обложки: {content_type or '—'}")
+                declared = int(resp.headers.get("content-length") or 0)
+                if declared > max_bytes:
+                    raise ValueError(f"Обложка слишком большая: {declared} байт")
+                async for chunk in resp.aiter_bytes(64 * 1024):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"Обложка больше {COVER_MAX_MB:g} МБ, загрузка прервана")
+                    hasher.update(chunk)
+                    f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, hasher.hexdigest()
+
+
+def discard_file(path: str) -> None:
+    """Удаляет файл, если он есть (временные загрузки, отбракованные
+    обложки).
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def check_repeat(tmp_path: str, content_hash: str) -> tuple:
+    """Была ли такая обложка раньше: (причина или None, dHash файла).
+    Сначала точное совпадение байтов, затем визуальное по dHash.
+    """
+    if has_file_hash(content_hash):
+        return "по содержимому", None
+    if not COVER_DHASH_ENABLED:
+        return None, None
+    value = dhash_file(tmp_path)
+    if value is None:
+        return None, None
+    distance = find_similar(value, COVER_DHASH_MAX_DISTANCE)
+    if distance is not None:
+        return f"визуально, dHash-расстояние {distance}", value
+    return None, value
+
+
+# Расширение файла по формату, который определил Pillow
+_COVER_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+
+
+def store_cover(tmp_path: str, base_name: str) -> str:
+    """Сохраняет скачанный оригинал как есть (без перекодирования в PNG)
+    под base_name с расширением по фактическому формату. Читается только
+    заголовок файла. Возвращает путь.
+    """
+    ext = ".jpg"
+    try:
+        from PIL import Image
+
+        with Image.open(tmp_path) as img:
+            ext = _COVER_EXTENSIONS.get(img.format, ext)
+    except Exception:
+        pass
+    path = base_name + ext
+    os.replace(tmp_path, path)
+    return path
+
+
+def _save_cover(tmp_path: str, content_hash: str, base_name: str, filename: str,
+                dhash: Optional[int] = None) -> str:
+    """Сохраняет скачанную обложку, строит рендишены, обновляет
+    final_cover.jpg и учитывает обложку в хранилище data/covers
+    (синхронно: Pillow, файловая система и SQLite). Возвращает путь к
+    оригиналу.
+    """
+    unique_name = store_cover(tmp_path, base_name)
+    publish_cover(unique_name, filename, content_hash)
+    # В реестр идёт хэш скачанного оригинала — его же сверяет has_file_hash;
+    # заодно вытесняются старые обложки сверх бюджета
+    register_cover(unique_name, content_hash, dhash)
+    return unique_name
+
+
+def publish_cover(unique_name: str, filename: str, content_hash: Optional[str] = None) -> None:
+    """Строит рендишены обложки (одно декодирование, кэш по хэшу) и
+    копирует Telegram-версию в final_cover.jpg.
+    """
+    # Совместимый путь final_cover.jpg — готовый Telegram-рендишен
+    try:
+        renditions = render_renditions(unique_name, content_hash)
+        # Копируем (не ссылка) чтобы внешние загрузчики работали одинаково
+        shutil.copyfile(renditions["telegram"], filename)
+    except Exception as e:
+        print(f"⚠️ Не удалось подготовить рендишены {unique_name}: {e}")
+        try:
+            shutil.copyfile(unique_name, filename)
+        except Exception:
+            pass
+
+
+async def generate_image_async(
+    prompt: str,
+    filename: str = "data/final_cover.jpg",
+    candidates: Optional[List[str]] = None,
 ) -> Optional[str]:
     """Находит изображение в Pixabay и сохраняет локально.
-    Теперь сохраняем под уникальным именем вида data/covers/<id>.png, а
-    также обновляем симлинк/копию final_cover.png для совместимости.
+    Оригинал сохраняется без перекодирования под уникальным именем вида
+    data/covers/<id>.jpg, рядом строятся рендишены для Telegram и
+    Instagram (utils.image_tools.render_renditions), а final_cover.jpg
+    обновляется для совместимости.
+    Готовые поисковые фразы (candidates, например теги из
+    generate_post_bundle) избавляют от отдельного запроса к GPT.
+    Если в пуле (core.cover_pool) есть обложка под тему, берётся она.
     """
     try:
+        candidates = clean_candidates(candidates or [])
+        if COVER_POOL_ENABLED:
+            # Ленивый импорт: cover_pool сам строится на этом модуле
+            from core.cover_pool import pick_cover
+
+            try:
+                pooled = await asyncio.to_thread(
+                    pick_cover, " ".join([prompt or "", *candidates]), filename
+                )
+            except Exception as e:
+                print(f"⚠️ Пул обложек недоступен: {e}")
+                pooled = None
+            if pooled:
+                return pooled
+
         print("Поиск изображения (Pixabay)...")
-        candidates = generate_search_candidates(prompt)
-        # Подстрахуемся от повторов: до 3 волн с дополнительным шумом
+        if not candidates:
+            candidates = await generate_search_candidates_async(prompt)
+        # Теги фото сверяются с промптом и поисковыми фразами
+        context = " ".join([prompt or "", *candidates])
+        # Подстрахуемся от пустой выдачи: до 3 волн с дополнительным шумом
         last_error = None
-        image_url = None
+        ranked = []
+        # Один предел времени на все волны
+        deadline = asyncio.get_running_loop().time() + PIXABAY_SEARCH_DEADLINE
         for attempt in range(1, 4):
+            if asyncio.get_running_loop().time() >= deadline:
+                break
             try:
-                image_url = search_pixabay_image(candidates)
+                ranked = await rank_pixabay_candidates_async(candidates, context, deadline)
                 break
             except Exception as e:
                 last_error = e
                 # добавим шум к каждому кандидату
                 noisy = [enrich_query(f"{c} {random.choice(['global', 'markets', 'finance', 'economy'])}")[:80] for c in candidates]
                 candidates = list(dict.fromkeys(noisy))  # dedup, сохранить порядок
-        if not image_url:
+        if not ranked:
             raise last_error or RuntimeError("No image found")
 
-        print("Загружаем изображение...")
-        resp = requests.get(image_url, timeout=30)
-        resp.raise_for_status()
-
-        # Определяем уникальное имя
-        os.makedirs("data/covers", exist_ok=True)
-        # Извлечём id из URL (хэш/числа перед _<size> .jpg/.jpeg/.png)
-        uniq_id = None
-        match = re.search(r"/get/([^/_]+)_\d+\.(?:jpg|jpeg|png)$", image_url, re.IGNORECASE)
-        if match:
-            uniq_id = match.group(1)
-        if not uniq_id:
-            # Фолбэк: хэш URL, чтобы гарантировать уникальность
-            import hashlib
-            uniq_id = hashlib.sha1(image_url.encode("utf-8")).hexdigest()[:40]
-        unique_name = f"data/covers/{uniq_id}.png"
-
-        # Перекодируем в PNG, чтобы расширение совпадало с содержимым
-        # Проверим хэш содержимого до сохранения, чтобы не повторять обложки
-        import hashlib
-        content_hash = hashlib.sha256(resp.content).hexdigest()
-        if has_file_hash(content_hash):
-            print("⚠️ Скачанное изображение ранее уже использовалось (по содержимому). Пробуем другой вариант...")
-            # Вторая попытка: другой вариант запроса
+        http = get_async_http_client()
+        os.makedirs(COVERS_DIR, exist_ok=True)
+        # Лучшие фото волны по очереди: если скачанное уже было обложкой
+        # (по содержимому), берём следующее без нового поиска. Использованным
+        # отмечается только фото, ставшее обложкой: отвергнутые не попадают
+        # в недавние запросы (recent_themes)
+        tries = ranked[:max(1, COVER_RANK_TRIES)]
+        tmp_path = None
+        chosen = None
+        for n, (image_id, hit, variant) in enumerate(tries, 1):
+            image_url = hit["url"]
+            print(f"Найдено изображение (Pixabay): {image_url} | вариант запроса '{variant}'")
+            print("Загружаем изображение...")
             try:
-                alt_query = enrich_query(search_query + " finance markets")[:80]
-                image_url = search_pixabay_image(alt_query)
-                resp = requests.get(image_url, timeout=30)
-                resp.raise_for_status()
-                content_hash = hashlib.sha256(resp.content).hexdigest()
-                if has_file_hash(content_hash):
-                    print("⚠️ Повтор и по альтернативе. Оставляем как есть, чтобы не зациклиться.")
-                else:
-                    # обновим uniq_id по второму URL
-                    match = re.search(r"/get/([^/_]+)_\d+\.(?:jpg|jpeg|png)$", image_url, re.IGNORECASE)
-                    if match:
-                        uniq_id = match.group(1)
-                    unique_name = f"data/covers/{uniq_id}.png"
-            except Exception as _e:
-                pass
-
-        try:
-            img = Image.open(BytesIO(resp.content)).convert("RGB")
-            img.save(unique_name, format="PNG")
-        except Exception:
-            with open(unique_name, "wb") as f:
-                f.write(resp.content)
-        mark_file_saved(unique_name)
-
-        # Синхронизируем совместимый путь final_cover.png
-        try:
-            # Копируем (не ссылка) чтобы внешние загрузчики работали одинаково
-            import shutil
-            shutil.copyfile(unique_name, filename)
-        except Exception as _e:
-            pass
-
-        # Ротация: ограничиваем число файлов в data/covers
-        try:
-            covers = sorted(
-                [
-                    os.path.join("data/covers", f)
-                    for f in os.listdir("data/covers")
-                    if f.lower().endswith(".png")
-                ],
-                key=lambda p: os.path.getmtime(p),
-            )
-            if len(covers) > MAX_COVERS:
-                to_delete = covers[: len(covers) - MAX_COVERS]
-                for old in to_delete:
-                    try:
-                        os.remove(old)
-                        print(f"🧹 Удалён старый cover: {old}")
-                    except Exception:
-                        pass
-        except Exception as rot_e:
-            print(f"⚠️ Ошибка ротации обложек: {rot_e}")
+                path, digest = await download_image(http, image_url)
+            except Exception as e:
+                print(f"⚠️ Не удалось скачать {image_url}: {e}")
+                continue
+            if tmp_path:
+                discard_file(tmp_path)
+            tmp_path, content_hash = path, digest
+            chosen = (image_id or "", image_url, variant)
+            # Определяем уникальное имя (расширение — по формату файла)
+            base_name = cover_base_name(image_url)
+            # Проверим содержимое до сохранения, чтобы не повторять обложки
+            repeat, dhash = await asyncio.to_thread(check_repeat, tmp_path, content_hash)
+            if not repeat:
+                break
+            if n < len(tries):
+                print(f"⚠️ Скачанное изображение ранее уже использовалось ({repeat}). Пробуем следующее...")
+            else:
+                print(f"⚠️ Повтор и у следующих кандидатов ({repeat}). Оставляем как есть, чтобы не зациклиться.")
+        if not tmp_path:
+            raise RuntimeError("Не удалось скачать ни одного кандидата")
 
+        unique_name = await asyncio.to_thread(
+            _save_cover, tmp_path, content_hash, base_name, filename, dhash
+        )
+        await asyncio.to_thread(mark_used, "pixabay", *chosen)
         print(f"Изображение сохранено: {unique_name} (и обновлён {filename})")
         return unique_name
     except Exception as exc:
         print(f"Ошибка получения изображения: {exc}")
         return None
+
+
+def generate_image(
+    prompt: str,
+    filename: str = "data/final_cover.jpg",
+    candidates: Optional[List[str]] = None,
+) -> Optional[str]:
+    return asyncio.run(generate_image_async(prompt, filename, candidates))
@@ -1,9 +1,8 @@
 # core/image_prompt_generator.py
 
-from openai import OpenAI
-from config.settings import OPENAI_API_KEY
+import asyncio
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+from core.llm_cache import chat_completion_async
 
 SYSTEM_PROMPT = """
 Ты помощник для поиска изображений. На основе финансовой сводки создай текст, который поможет найти подходящее изображение.
@@ -17,9 +16,10 @@ SYSTEM_PROMPT = """
 """
 
 
-def generate_image_prompt(post_text: str) -> str:
+async def generate_image_prompt_async(post_text: str) -> str:
     try:
-        response = client.chat.completions.create(
+        content = await chat_completion_async(
+            "image_prompt",
             model="gpt-3.5-turbo",
             temperature=0.5,
             messages=[
@@ -27,7 +27,11 @@ def generate_image_prompt(post_text: str) -> str:
                 {"role": "user", "content": post_text}
             ]
         )
-        return response.choices[0].message.content.strip()
+        return content.strip()
     except Exception as e:
         print(f"❌ Ошибка генерации промпта: {e}")
         return "Financial news and market analysis"
+
+
+def generate_image_prompt(post_text: str) -> str:
+    return asyncio.run(generate_image_prompt_async(post_text))
@@ -1,17 +1,12 @@
 # core/instagram_publisher.py
 
+import asyncio
 import os
 import json
-import time
-import requests
-from time import sleep
-from dotenv import load_dotenv
-from utils.image_tools import prepare_for_instagram
 
-load_dotenv()
-
-IG_USER_ID = os.getenv("IG_USER_ID")
-IG_ACCESS_TOKEN = os.getenv("IG_ACCESS_TOKEN")
+from config.settings import IG_USER_ID, IG_ACCESS_TOKEN
+from core.clients import get_async_http_client
+from utils.image_tools import render_renditions
 
 def _is_token_invalid(resp_text: str) -> bool:
     try:
@@ -22,15 +17,17 @@ def _is_token_invalid(resp_text: str) -> bool:
         return False
 
 
-def publish_to_instagram(image_url: str, caption: str, local_path: str = None):
+async def publish_to_instagram_async(image_url: str, caption: str, local_path: str = None):
     print("📸 Публикуем в Instagram...")
 
     # Если есть локальный путь, подготовим IG-friendly версию и перезальём на FreeImage
     if local_path and os.path.exists(local_path):
-        safe_jpg = prepare_for_instagram(local_path, "data/ig_cover.jpg", variant="portrait")
+        # 4:5 рендишен; для обложки из generate_image он уже в кэше
+        renditions = await asyncio.to_thread(render_renditions, local_path)
+        safe_jpg = renditions["ig_portrait"]
         # Загрузим обработанный файл на FreeImage.host
-        from core.freeimage_uploader import upload_to_freeimage
-        image_url = upload_to_freeimage(safe_jpg)
+        from core.freeimage_uploader import upload_to_freeimage_async
+        image_url = await upload_to_freeimage_async(safe_jpg)
 
     # 1. Создание media object
     create_url = f"https://graph.facebook.com/v18.0/{IG_USER_ID}/media"
@@ -39,9 +36,10 @@ def publish_to_instagram(image_url: str, caption: str, local_path: str = None):
         "caption": caption,
         "access_token": IG_ACCESS_TOKEN
     }
+    http = get_async_http_client()
     # Несколько попыток на случай сетевых/временных сбоев
     for attempt in range(1, 4):
-        create_resp = requests.post(create_url, data=create_params, timeout=30)
+        create_resp = await http.post(create_url, data=create_params, timeout=30)
         if create_resp.status_code == 200:
             break
         # Токен протух — не будем ретраить, сразу фейлим понятным текстом
@@ -51,7 +49,7 @@ def publish_to_instagram(image_url: str, caption: str, local_path: str = None):
                 " Обновите IG_ACCESS_TOKEN в .env и перезапустите сервис."
             )
         if attempt < 3:
-            time.sleep(3 * attempt)
+            await asyncio.sleep(3 * attempt)
             continue
         raise Exception(f"❌ Ошибка создания media объекта: {create_resp.text}")
 
@@ -65,9 +63,9 @@ def publish_to_instagram(image_url: str, caption: str, local_path: str = None):
         "access_token": IG_ACCESS_TOKEN
     }
 
-    sleep(5)  # дать IG время подготовить изображение
+    await asyncio.sleep(5)  # дать IG время подготовить изображение
     for attempt in range(1, 4):
-        publish_resp = requests.post(publish_url, data=publish_params, timeout=30)
+        publish_resp = await http.post(publish_url, data=publish_params, timeout=30)
         if publish_resp.status_code == 200:
             break
         if _is_token_invalid(publish_resp.text):
@@ -76,8 +74,12 @@ def publish_to_instagram(image_url: str, caption: str, local_path: str = None):
                 " Обновите IG_ACCESS_TOKEN в .env и перезапустите сервис."
             )
         if attempt < 3:
-            time.sleep(3 * attempt)
+            await asyncio.sleep(3 * attempt)
             continue
         raise Exception(f"❌ Ошибка публикации в Instagram: {publish_resp.text}")
 
-    print("✅ Пост опубликован в Instagram")
\ No newline at end of file
+    print("✅ Пост опубликован в Instagram")
+
+
+def publish_to_instagram(image_url: str, caption: str, local_path: str = None):
+    return asyncio.run(publish_to_instagram_async(image_url, caption, local_path))
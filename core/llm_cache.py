@@ -0,0 +1,66 @@
+# core/llm_cache.py
+#
+# Запросы к OpenAI через общий кэш ответов: ключ — модель, параметры и
+# сообщения, так что повторный запуск режима (или --force после ошибки
+# загрузки) получает те же ответы без обращения к API.
+
+import asyncio
+from typing import Optional
+
+from config.settings import LLM_CACHE_ENABLED, LLM_CACHE_TTL_HOURS
+from core.clients import get_async_openai_client
+from utils.post_logger import log_post_event
+from utils.response_cache import cache_get, cache_put, make_key
+
+NAMESPACE = "openai_chat"
+
+# Параметры транспорта, не влияющие на ответ модели
+_TRANSPORT_PARAMS = ("timeout",)
+
+
+def _lookup(call: str, model: str, messages: list, params: dict):
+    """(ключ, ответ из кэша). Ключ None — кэш выключен или недоступен."""
+    if not LLM_CACHE_ENABLED:
+        return None, None
+    key = make_key({
+        "model": model,
+        "messages": messages,
+        "params": {k: v for k, v in params.items() if k not in _TRANSPORT_PARAMS},
+    })
+    try:
+        cached = cache_get(NAMESPACE, key)
+    except Exception as e:
+        print(f"⚠️ Кэш ответов недоступен: {e}")
+        return None, None
+    status = "hit" if cached is not None else "miss"
+    log_post_event({"stage": "llm_cache", "status": status, "call": call, "model": model})
+    return key, cached
+
+
+def _store(key: Optional[str], content: str) -> None:
+    # Пустые ответы не кэшируются
+    if key is None or not content.strip():
+        return
+    try:
+        cache_put(NAMESPACE, key, content, LLM_CACHE_TTL_HOURS * 3600)
+    except Exception as e:
+        print(f"⚠️ Не удалось сохранить ответ в кэш: {e}")
+
+
+async def chat_completion_async(call: str, model: str, messages: list, **params) -> str:
+    """Текст ответа chat.completions (без strip). `call` — имя места
+    вызова для лога событий (summary, image_prompt, search_query, ...).
+    """
+    key, cached = await asyncio.to_thread(_lookup, call, model, messages, params)
+    if cached is not None:
+        return cached
+    response = await get_async_openai_client().chat.completions.create(
+        model=model, messages=messages, **params
+    )
+    content = response.choices[0].message.content or ""
+    await asyncio.to_thread(_store, key, content)
+    return content
+
+
+def chat_completion(call: str, model: str, messages: list, **params) -> str:
+    return asyncio.run(chat_completion_async(call, model, messages, **params))
@@ -1,14 +1,40 @@
-import os
-from telethon.sync import TelegramClient
-from telethon.tl.functions.messages import GetHistoryRequest
-from config.settings import TELEGRAM_API_ID, TELEGRAM_API_HASH
-import sqlite3
-from utils.hash_utils import get_hash
+import asyncio
+from typing import NamedTuple
+from datetime import datetime, timezone
+from config.settings import (
+    COLLECT_CONCURRENCY,
+    COLLECT_INCREMENTAL,
+    COLLECT_PAGINATE,
+    COLLECT_PAGE_SIZE,
+    COLLECT_MAX_PAGES,
+    NEAR_DUP_ENABLED,
+    NEAR_DUP_MAX_DISTANCE,
+    NEAR_DUP_HISTORY_HOURS,
+    PROCESSED_TTL_DAYS,
+)
+from core.clients import get_telegram_client
+from utils.hash_utils import get_hash, get_fingerprint, normalize_text
+from utils.simhash import simhash, SimHashIndex
+from utils.ad_filter import is_advertisement  # 🚫 правила в config/ad_words.txt
+from utils.post_registry import (
+    transaction,
+    get_watermarks,
+    advance_watermarks,
+    filter_new_fingerprints,
+    mark_processed,
+    compact_processed,
+    load_near_duplicates,
+    add_near_duplicates,
+    prune_near_duplicates,
+    get_channel_peers,
+    save_channel_peer,
+    forget_channel_peer,
+    buffer_posts,
+    take_buffered_posts,
+    prune_buffered_posts,
+)
 import pytz
-
-SESSION_DIR = os.path.join("sessions")
-os.makedirs(SESSION_DIR, exist_ok=True)
-client = TelegramClient(os.path.join(SESSION_DIR, "parser"), TELEGRAM_API_ID, TELEGRAM_API_HASH)
+import time
 
 CHANNELS = [
     "https://t.me/markettwits",
@@ -18,66 +44,323 @@ CHANNELS = [
     
 ]
 
-conn = sqlite3.connect("data/processed.db")
-cursor = conn.cursor()
+class CollectedPost(NamedTuple):
+    channel: str
+    message_id: int
+    date: datetime
+    text: str
 
-# 🚫 Слова-фильтры рекламы
-BAD_WORDS = ["курс", "подпишись", "промокод", "обучение", "трейдинг", "вебинар", "записаться", "тренинг", "морафон","youtube","appstore" ]
 
-def is_advertisement(text: str) -> bool:
-    return any(bad_word.lower() in text.lower() for bad_word in BAD_WORDS)
+def message_text(message):
+    """Текст сообщения, годный к публикации, или None (служебное
+    сообщение, пустой текст, реклама).
+    """
+    # Служебные сообщения (MessageService) не имеют текста
+    content = (getattr(message, "message", None) or "").strip()
+    if not content:
+        return None
+    # 🔎 Фильтрация рекламы
+    if is_advertisement(content):
+        return None
+    return content
 
-async def fetch_new_posts(start_time=None, end_time=None, limit_per_channel=20):
-    new_posts = []
 
-    await client.start()
-    for channel in CHANNELS:
-        try:
-            entity = await client.get_entity(channel)
-            history = await client(GetHistoryRequest(
-                peer=entity,
-                limit=limit_per_channel,
-                offset_date=None,
-                offset_id=0,
-                max_id=0,
-                min_id=0,
-                add_offset=0,
-                hash=0
-            ))
-
-            for message in history.messages:
-                if not message.message:
-                    continue
+async def _fetch_window_history(entity, start_time, end_time, min_id=0):
+    """Постранично читает историю канала назад от end_time.
+    Первая страница запрашивается через offset_date=end_time, следующие —
+    через offset_id самого старого полученного сообщения. Чтение
+    прекращается, как только страница заходит раньше start_time, оказалась
+    неполной (история или min_id исчерпаны) или достигнут COLLECT_MAX_PAGES.
+    """
+    from telethon.tl.functions.messages import GetHistoryRequest
+
+    client = get_telegram_client()
+    messages = []
+    offset_id = 0
+    offset_date = end_time
+    for _ in range(max(1, COLLECT_MAX_PAGES)):
+        history = await client(GetHistoryRequest(
+            peer=entity,
+            limit=COLLECT_PAGE_SIZE,
+            offset_date=offset_date,
+            offset_id=offset_id,
+            max_id=0,
+            min_id=min_id,
+            add_offset=0,
+            hash=0
+        ))
+        batch = history.messages
+        if not batch:
+            break
+        messages.extend(batch)
+        oldest = batch[-1]
+        if len(batch) < COLLECT_PAGE_SIZE or oldest.date < start_time:
+            break
+        offset_id = oldest.id
+        offset_date = None
+    return messages
+
+
+async def resolve_peer(channel, peers):
+    """Возвращает peer канала: из локального кэша (id + access_hash) без
+    обращения к сети или через get_entity с сохранением в кэш.
+    """
+    from telethon.tl.types import InputPeerChannel
 
-                message_time = message.date.astimezone(pytz.timezone("Europe/Moscow"))
+    cached = peers.get(channel)
+    if cached:
+        return InputPeerChannel(channel_id=cached[0], access_hash=cached[1])
+    entity = await get_telegram_client().get_entity(channel)
+    access_hash = getattr(entity, "access_hash", None)
+    if access_hash is not None:
+        save_channel_peer(channel, entity.id, access_hash)
+        peers[channel] = (entity.id, access_hash)
+    return entity
 
-                # Apply time window filter if provided
-                if start_time is not None and end_time is not None:
-                    try:
-                        if not (start_time <= message_time <= end_time):
-                            continue
-                    except Exception:
-                        # In case of tz-aware mismatches, skip silently
+
+async def _read_history(peer, start_time, end_time, limit_per_channel, min_id, paginate):
+    if paginate and start_time is not None and end_time is not None:
+        return await _fetch_window_history(peer, start_time, end_time, min_id)
+    from telethon.tl.functions.messages import GetHistoryRequest
+
+    history = await get_telegram_client()(GetHistoryRequest(
+        peer=peer,
+        limit=limit_per_channel,
+        offset_date=None,
+        offset_id=0,
+        max_id=0,
+        min_id=min_id,
+        add_offset=0,
+        hash=0
+    ))
+    return history.messages
+
+
+async def _fetch_channel(channel, semaphore, start_time=None, end_time=None, limit_per_channel=20, min_id=0, paginate=False, peers=None):
+    """Забирает историю одного канала (только сообщения новее `min_id`).
+    С paginate=True и заданным окном история читается постранично и
+    покрывает окно целиком; иначе берутся последние limit_per_channel.
+    Возвращает (посты CollectedPost, водяной знак), где водяной знак —
+    (id, дата, начало окна) самого нового сообщения внутри окна (без окна
+    — самого нового) или None.
+    Ошибки канала изолированы: при сбое возвращается ([], None), а
+    закэшированный peer канала сбрасывается.
+    """
+    posts = []
+    watermark = None
+    peers = {} if peers is None else peers
+    try:
+        async with semaphore:
+            args = (start_time, end_time, limit_per_channel, min_id, paginate)
+            from_cache = channel in peers
+            try:
+                messages = await _read_history(await resolve_peer(channel, peers), *args)
+            except Exception as e:
+                if not from_cache:
+                    raise
+                # access_hash мог устареть — резолвим заново один раз
+                print(f"⚠️ Кэш peer устарел для {channel}: {e}")
+                forget_channel_peer(channel)
+                peers.pop(channel, None)
+                messages = await _read_history(await resolve_peer(channel, peers), *args)
+
+        for message in messages:
+            message_time = message.date.astimezone(pytz.timezone("Europe/Moscow"))
+
+            # Apply time window filter if provided
+            if start_time is not None and end_time is not None:
+                try:
+                    if not (start_time <= message_time <= end_time):
                         continue
+                except Exception:
+                    # In case of tz-aware mismatches, skip silently
+                    continue
+
+            # Водяной знак двигают только сообщения окна: пропущенные
+            # (после конца окна или раньше его начала) понадобятся
+            # запуску с другим окном
+            if watermark is None or message.id > watermark[0]:
+                watermark = (
+                    message.id,
+                    message.date.isoformat(),
+                    start_time.isoformat() if start_time is not None else None,
+                )
 
-                content = message.message.strip()
+            content = message_text(message)
+            if content is None:
+                continue  # служебные, пустые и рекламные сообщения
 
-                # 🔎 Фильтрация рекламы
-                if is_advertisement(content):
-                    continue  # пропускаем рекламные сообщения
+            posts.append(CollectedPost(channel, message.id, message.date, content))
 
-                content_hash = get_hash(content)
+    except Exception as e:
+        print(f"❌ Ошибка при обработке канала {channel}: {e}")
+        if channel in peers:
+            forget_channel_peer(channel)
+            peers.pop(channel, None)
+        return [], None
 
-                cursor.execute("SELECT 1 FROM processed WHERE message_hash = ?", (content_hash,))
-                if cursor.fetchone():
-                    continue  # уже обработано
+    return posts, watermark
+
+
+def _min_id(watermark, start_time):
+    """min_id для запроса истории по водяному знаку (id, дата, начало
+    окна). Знак применяется, если окно начинается не раньше окна, в
+    котором знак сдвинут, или позже самого знака. Иначе (окно раньше уже
+    собранного: ручной или повторный запуск) часть сообщений окна лежит
+    ниже знака — история читается целиком, повторы отсечёт processed.
+    """
+    if watermark is None:
+        return 0
+    last_id, last_date, window_start = watermark
+    if start_time is None:
+        return last_id
+    for bound in (window_start, last_date):
+        try:
+            if bound and datetime.fromisoformat(bound) <= start_time:
+                return last_id
+        except (TypeError, ValueError):
+            continue
+    return 0
+
+
+def _drop_near_duplicates(posts):
+    """Отсекает почти-дубликаты (одна новость из разных каналов с другими
+    эмодзи/ссылками) внутри прогона и против последних
+    NEAR_DUP_HISTORY_HOURS часов. Возвращает (посты, их SimHash).
+    """
+    if not NEAR_DUP_ENABLED or not posts:
+        return posts, []
+    hashes = [simhash(p.text) for p in posts]
+    history = load_near_duplicates(
+        [h for h in hashes if h is not None],
+        since=time.time() - NEAR_DUP_HISTORY_HOURS * 3600,
+    )
+    index = SimHashIndex(NEAR_DUP_MAX_DISTANCE, history)
+    kept, kept_hashes = [], []
+    for post, h in zip(posts, hashes):
+        if h is not None:
+            if index.find(h) is not None:
+                continue
+            index.add(h)
+            kept_hashes.append(h)
+        kept.append(post)
+    if len(kept) < len(posts):
+        print(f"♻️ Пропущено почти-дубликатов: {len(posts) - len(kept)}")
+    return kept, kept_hashes
+
+
+def register_posts(posts, marks=None, buffer=False):
+    """Дедуплицирует посты (точные отпечатки + почти-дубликаты) и одной
+    транзакцией помечает их обработанными, сдвигает водяные знаки `marks`
+    и, при buffer=True, кладёт принятые посты в локальную таблицу posts.
+    Возвращает принятые посты в исходном порядке.
+    """
+    # Одна выборка по processed на все посты
+    candidates = [
+        (get_fingerprint(p.text), get_hash(p.text), p)
+        for p in posts
+        if normalize_text(p.text)  # только ссылки/упоминания — сравнивать нечего
+    ]
+    fresh = set(filter_new_fingerprints(
+        [f for f, _, _ in candidates],
+        [h for _, h, _ in candidates],
+    ))
+    new_fingerprints, accepted = [], []
+    for fingerprint, _, post in candidates:
+        if fingerprint not in fresh:
+            continue  # уже обработано (раньше или в этом прогоне)
+        fresh.discard(fingerprint)
+        new_fingerprints.append(fingerprint)
+        accepted.append(post)
+    accepted, new_simhashes = _drop_near_duplicates(accepted)
+
+    with transaction():
+        mark_processed(new_fingerprints, commit=False)
+        compact_processed(PROCESSED_TTL_DAYS * 86400, commit=False)
+        advance_watermarks(marks or {}, commit=False)
+        if NEAR_DUP_ENABLED:
+            add_near_duplicates(new_simhashes, commit=False)
+            prune_near_duplicates(time.time() - NEAR_DUP_HISTORY_HOURS * 3600, commit=False)
+        if buffer:
+            buffer_posts(
+                [(p.channel, p.message_id, p.date.timestamp(), p.text) for p in accepted],
+                commit=False,
+            )
+            prune_buffered_posts(time.time() - PROCESSED_TTL_DAYS * 86400, commit=False)
+    return accepted
+
+
+def fetch_buffered_posts(start_time=None, end_time=None, with_meta=False):
+    """Читает посты окна из локального буфера, который наполняет
+    core.stream_collector, без сетевых запросов. Выданные посты
+    помечаются использованными и повторно не возвращаются.
+    with_meta=True возвращает CollectedPost вместо текстов.
+    """
+    since = start_time.timestamp() if start_time is not None else 0
+    until = end_time.timestamp() if end_time is not None else time.time()
+    posts = [
+        CollectedPost(channel, message_id, datetime.fromtimestamp(posted_at, timezone.utc), text)
+        for channel, message_id, posted_at, text in take_buffered_posts(since, until)
+    ]
+    return posts if with_meta else [p.text for p in posts]
+
+
+async def fetch_new_posts(start_time=None, end_time=None, limit_per_channel=20, concurrency=None, incremental=None, paginate=None, buffer=False, disconnect=True, with_meta=False):
+    """Собирает новые посты из CHANNELS.
+    Каналы опрашиваются параллельно (не более `concurrency` одновременно,
+    по умолчанию COLLECT_CONCURRENCY); результат объединяется в порядке
+    CHANNELS, поэтому дедупликация и порядок постов детерминированы.
+    В инкрементальном режиме (по умолчанию COLLECT_INCREMENTAL) у Telegram
+    запрашиваются только сообщения новее водяного знака канала (если окно
+    не начинается раньше уже собранного, см. _min_id); знаки сдвигаются до
+    последнего сообщения окна одной транзакцией после обработки всех
+    каналов.
+    Если задано окно и включена пагинация (по умолчанию COLLECT_PAGINATE),
+    окно читается целиком страницами по COLLECT_PAGE_SIZE, а
+    limit_per_channel не применяется.
+    buffer=True дополнительно кладёт принятые посты в таблицу posts
+    (используется core.stream_collector). with_meta=True возвращает
+    CollectedPost (канал, id, дата, текст) вместо текстов.
+    """
+    new_posts = []
+    semaphore = asyncio.Semaphore(max(1, concurrency or COLLECT_CONCURRENCY))
+    if incremental is None:
+        incremental = COLLECT_INCREMENTAL
+    if paginate is None:
+        paginate = COLLECT_PAGINATE
+    watermarks = get_watermarks() if incremental else {}
+    peers = get_channel_peers()
+
+    client = get_telegram_client()
+    await client.start()
+    per_channel = await asyncio.gather(*(
+        _fetch_channel(
+            channel,
+            semaphore,
+            start_time,
+            end_time,
+            limit_per_channel,
+            min_id=_min_id(watermarks.get(channel), start_time),
+            paginate=paginate,
+            peers=peers,
+        )
+        for channel in CHANNELS
+    ))
 
-                new_posts.append(content)
-                cursor.execute("INSERT INTO processed (message_hash) VALUES (?)", (content_hash,))
-                conn.commit()
+    new_marks = {}
+    collected = []
+    for channel, (posts, watermark) in zip(CHANNELS, per_channel):
+        if incremental and watermark is not None:
+            new_marks[channel] = watermark
+        collected.extend(posts)
 
-        except Exception as e:
-            print(f"❌ Ошибка при обработке канала {channel}: {e}")
+    try:
+        new_posts = register_posts(collected, new_marks, buffer=buffer)
+        if not with_meta:
+            new_posts = [p.text for p in new_posts]
+    except Exception as e:
+        print(f"❌ Ошибка дедупликации постов: {e}")
 
-    await client.disconnect()
-    return new_posts
\ No newline at end of file
+    if disconnect:
+        await client.disconnect()
+    return new_posts
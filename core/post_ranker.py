@@ -0,0 +1,140 @@
+# core/post_ranker.py
+#
+# Локальное ранжирование постов перед сводкой: в модель уходят только
+# RANK_TOP_K самых информативных постов окна.
+
+import math
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+from config.settings import (
+    RANK_TOP_K,
+    RANK_CHANNEL_WEIGHTS,
+    RANK_RECENCY_HALF_LIFE_HOURS,
+)
+from utils.ad_filter import compile_rules
+from utils.ranking import MARKET_KEYWORDS, MIN_TERM_LEN, POST_WEIGHTS, WORD_RE, unit, weighted_sum
+
+
+@lru_cache(maxsize=1)
+def _keyword_pattern():
+    return compile_rules(MARKET_KEYWORDS)
+
+
+def _channel_weights() -> Dict[str, float]:
+    """RANK_CHANNEL_WEIGHTS: "markettwits=1.2,moexdiv=0.8" (по имени канала)."""
+    weights = {}
+    for item in (RANK_CHANNEL_WEIGHTS or "").split(","):
+        name, _, value = item.partition("=")
+        try:
+            weights[name.strip().lower().rsplit("/", 1)[-1]] = float(value)
+        except ValueError:
+            continue
+    return weights
+
+
+def score_posts(posts: Sequence, now: Optional[float] = None):
+    """Оценки информативности постов (numpy-массив той же длины).
+    Посты — CollectedPost (нужны .text, .channel и .date).
+
+    Складывается из:
+      - центральности TF-IDF: косинус поста с центроидом окна (насколько
+        пост о главных темах окна, а не о побочном шуме);
+      - плотности фактов: рыночные термины, числа/проценты, имена;
+      - свежести: экспоненциальное затухание с периодом полураспада
+        RANK_RECENCY_HALF_LIFE_HOURS;
+    и умножается на вес канала из RANK_CHANNEL_WEIGHTS.
+    """
+    import numpy as np
+
+    n = len(posts)
+    if n == 0:
+        return np.zeros(0)
+    now = time.time() if now is None else now
+
+    # Один проход регуляркой по каждому посту; всё остальное считается
+    # по словарю уникальных слов и numpy-массивам
+    all_words: List[str] = []
+    doc_ids: List[int] = []
+    for i, post in enumerate(posts):
+        words = WORD_RE.findall(post.text or "")
+        all_words.extend(words)
+        doc_ids.extend([i] * len(words))
+    vocab: Dict[str, int] = {word: idx for idx, word in enumerate(dict.fromkeys(all_words))}
+    word_ids = list(map(vocab.__getitem__, all_words))
+
+    centrality = np.zeros(n)
+    facts = np.zeros(n)
+    if word_ids:
+        # Признаки уникальных слов: термин TF-IDF (в нижнем регистре),
+        # рыночный термин, число или имя собственное (заглавная буква)
+        pattern = _keyword_pattern()
+        terms: Dict[str, int] = {}
+        term_of = np.empty(len(vocab), dtype=np.int64)
+        is_keyword = np.zeros(len(vocab))
+        is_fact = np.zeros(len(vocab))
+        for word, idx in vocab.items():
+            lowered = word.lower()
+            term_of[idx] = terms.setdefault(lowered, len(terms)) if len(word) >= MIN_TERM_LEN else -1
+            is_keyword[idx] = 1.0 if pattern is not None and pattern.match(lowered) else 0.0
+            is_fact[idx] = 1.0 if word[0].isdigit() or word[0].isupper() else 0.0
+
+        docs = np.asarray(doc_ids, dtype=np.int64)
+        words = np.asarray(word_ids, dtype=np.int64)
+        facts = (
+            np.bincount(docs, weights=is_keyword[words], minlength=n)
+            + 0.4 * np.bincount(docs, weights=is_fact[words], minlength=n)
+        )
+
+        # Разреженная матрица документ-термин в координатном виде
+        term_ids = term_of[words]
+        keep = term_ids >= 0
+        docs, term_ids = docs[keep], term_ids[keep]
+        if term_ids.size:
+            n_terms = len(terms)
+            # Уникальные пары (документ, термин) и их частоты
+            pairs, counts = np.unique(docs * n_terms + term_ids, return_counts=True)
+            pair_docs = pairs // n_terms
+            pair_terms = pairs % n_terms
+            df = np.bincount(pair_terms, minlength=n_terms)
+            idf = np.log((1 + n) / (1 + df)) + 1.0
+            weights = (1.0 + np.log(counts)) * idf[pair_terms]
+            norms = np.sqrt(np.bincount(pair_docs, weights=weights ** 2, minlength=n))
+            weights = weights / np.maximum(norms[pair_docs], 1e-12)
+            centroid = np.bincount(pair_terms, weights=weights, minlength=n_terms) / n
+            centrality = np.bincount(pair_docs, weights=weights * centroid[pair_terms], minlength=n)
+
+    ages_h = np.array([
+        max(0.0, now - post.date.timestamp()) / 3600 if post.date else 0.0
+        for post in posts
+    ])
+    half_life = max(RANK_RECENCY_HALF_LIFE_HOURS, 1e-6)
+    recency = np.exp(-math.log(2) * ages_h / half_life)
+
+    channel_weights = _channel_weights()
+    channel = np.array([
+        channel_weights.get((post.channel or "").lower().rsplit("/", 1)[-1], 1.0)
+        for post in posts
+    ])
+
+    score = weighted_sum(POST_WEIGHTS, {
+        "centrality": unit(centrality),
+        "keywords": unit(np.log1p(facts)),
+        "recency": recency,
+    })
+    return score * channel
+
+
+def rank_posts(posts: Sequence, top_k: Optional[int] = None, now: Optional[float] = None) -> list:
+    """Оставляет top_k (по умолчанию RANK_TOP_K) самых информативных постов
+    в исходном порядке. top_k <= 0 отключает отбор.
+    """
+    top_k = RANK_TOP_K if top_k is None else top_k
+    if top_k <= 0 or len(posts) <= top_k:
+        return list(posts)
+    import numpy as np
+
+    scores = score_posts(posts, now)
+    best = np.argpartition(-scores, top_k - 1)[:top_k]
+    return [posts[i] for i in sorted(best)]
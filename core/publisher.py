@@ -1,17 +1,12 @@
 # Публикация в Telegram и Instagram
-import os
-import requests
-from dotenv import load_dotenv
+import asyncio
+from pathlib import Path
 
-load_dotenv()
+from config.settings import TELEGRAM_BOT_TOKEN, TELEGRAM_CHANNEL_ID
+from core.clients import get_async_http_client
 
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHANNEL_ID = os.getenv("TELEGRAM_CHANNEL_ID")
 
-
-def publish_to_telegram(text: str, image_path: str):
-    import requests
-    from config.settings import TELEGRAM_BOT_TOKEN, TELEGRAM_CHANNEL_ID
+async def publish_to_telegram_async(text: str, image_path: str):
 
     url_photo = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
     url_text = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
@@ -21,23 +16,29 @@ def publish_to_telegram(text: str, image_path: str):
     caption = text[:max_caption_len]
     remainder = text[max_caption_len:].strip()
 
-    # 1. Отправляем фото с частью текста
-    with open(image_path, 'rb') as photo:
-        response = requests.post(url_photo, data={
-            "chat_id": TELEGRAM_CHANNEL_ID,
-            "caption": caption,
-            "parse_mode": "HTML"
-        }, files={"photo": photo})
+    http = get_async_http_client()
 
-    if not response.ok:
+    # 1. Отправляем фото с частью текста
+    photo = await asyncio.to_thread(Path(image_path).read_bytes)
+    response = await http.post(url_photo, data={
+        "chat_id": TELEGRAM_CHANNEL_ID,
+        "caption": caption,
+        "parse_mode": "HTML"
+    }, files={"photo": (Path(image_path).name, photo)})
+
+    if not response.is_success:
         raise RuntimeError(f"❌ Ошибка публикации фото в Telegram: {response.text}")
 
     # 2. Если остался хвост — отправляем как отдельное сообщение
     if remainder:
-        response = requests.post(url_text, data={
+        response = await http.post(url_text, data={
             "chat_id": TELEGRAM_CHANNEL_ID,
             "text": remainder,
             "parse_mode": "HTML"
         })
-        if not response.ok:
+        if not response.is_success:
             raise RuntimeError(f"❌ Ошибка публикации текста в Telegram: {response.text}")
+
+
+def publish_to_telegram(text: str, image_path: str):
+    return asyncio.run(publish_to_telegram_async(text, image_path))
@@ -0,0 +1,127 @@
+# core/stream_collector.py
+#
+# Постоянно работающий сборщик: держит соединение с Telegram, получает
+# новые сообщения каналов из CHANNELS по подписке и сразу кладёт
+# отфильтрованные и дедуплицированные посты в таблицу posts. Раз в
+# COLLECT_CATCHUP_INTERVAL_MINUTES история каналов догружается: так
+# приходят посты каналов, где аккаунт не состоит, и пропущенные подпиской.
+# main.py при COLLECT_SOURCE=buffer читает окно из этой таблицы без сети.
+#
+# Запуск:  python -u -m core.stream_collector
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytz
+from telethon import events, utils as tg_utils
+
+from core.clients import get_telegram_client
+from core.news_collector import (
+    CHANNELS,
+    CollectedPost,
+    fetch_new_posts,
+    register_posts,
+    message_text,
+    resolve_peer,
+)
+from utils.post_registry import get_channel_peers, forget_channel_peer
+from config.settings import COLLECT_CATCHUP_HOURS, COLLECT_CATCHUP_INTERVAL_MINUTES
+
+
+async def _catch_up() -> None:
+    """Догоняет сообщения, пришедшие пока сборщик был остановлен:
+    постраничный инкрементальный проход от водяных знаков (не глубже
+    COLLECT_CATCHUP_HOURS), но в буфер.
+    """
+    end_time = datetime.now(pytz.timezone("Europe/Moscow"))
+    start_time = end_time - timedelta(hours=COLLECT_CATCHUP_HOURS)
+    posts = await fetch_new_posts(
+        start_time,
+        end_time,
+        incremental=True,
+        paginate=True,
+        buffer=True,
+        disconnect=False,
+    )
+    print(f"📥 Догрузка после простоя: {len(posts)} новых постов в буфере")
+
+
+async def _catch_up_periodically() -> None:
+    """Страховка подписки: Telegram присылает NewMessage только по
+    каналам, где аккаунт состоит, и не гарантирует доставку обновлений
+    при обрывах связи — поэтому история догружается и по таймеру.
+    """
+    while True:
+        await asyncio.sleep(max(1, COLLECT_CATCHUP_INTERVAL_MINUTES) * 60)
+        try:
+            await _catch_up()
+        except Exception as e:
+            print(f"❌ Ошибка догрузки истории: {e}")
+
+
+async def _warn_not_joined(client, channel, peer) -> None:
+    """Предупреждает, если аккаунт не состоит в канале: новые сообщения
+    такого канала придут только с периодической догрузкой.
+    """
+    try:
+        entity = await client.get_entity(peer)
+    except Exception as e:
+        print(f"⚠️ Не удалось проверить участие в канале {channel}: {e}")
+        return
+    if getattr(entity, "left", False):
+        print(
+            f"⚠️ Аккаунт не подписан на {channel}: посты будут приходить "
+            f"с догрузкой раз в {COLLECT_CATCHUP_INTERVAL_MINUTES} мин"
+        )
+
+
+async def run_collector() -> None:
+    client = get_telegram_client()
+    await client.start()
+
+    # Разрешаем каналы (через кэш peer) и строим карту chat_id -> канал
+    peers = get_channel_peers()
+    chat_ids = {}
+    for channel in CHANNELS:
+        try:
+            peer = await resolve_peer(channel, peers)
+            chat_ids[tg_utils.get_peer_id(peer)] = channel
+        except Exception as e:
+            print(f"❌ Не удалось подписаться на канал {channel}: {e}")
+            forget_channel_peer(channel)
+            continue
+        await _warn_not_joined(client, channel, peer)
+    if not chat_ids:
+        raise RuntimeError("Нет ни одного доступного канала для подписки")
+
+    # Обработчик регистрируется до догрузки: сообщение, пришедшее во
+    # время неё, не потеряется (повтор отсечёт дедупликация). Водяные
+    # знаки он не двигает — их сдвигает только догрузка, читающая историю
+    # подряд, иначе пост, пропущенный подпиской, оказался бы ниже min_id
+    @client.on(events.NewMessage(chats=list(chat_ids)))
+    async def on_new_message(event):
+        channel = chat_ids.get(event.chat_id)
+        message = event.message
+        content = message_text(message)
+        if channel is None or content is None:
+            return
+        post = CollectedPost(channel, message.id, message.date, content)
+        try:
+            accepted = register_posts([post], buffer=True)
+        except Exception as e:
+            print(f"❌ Ошибка сохранения поста из {channel}: {e}")
+            return
+        if accepted:
+            print(f"📰 {channel}: новый пост #{message.id} в буфере")
+
+    await _catch_up()
+    catch_up_task = asyncio.create_task(_catch_up_periodically())
+
+    print(f"👂 Слушаем {len(chat_ids)} каналов...")
+    try:
+        await client.run_until_disconnected()
+    finally:
+        catch_up_task.cancel()
+
+if __name__ == "__main__":
+    asyncio.run(run_collector())
@@ -1,26 +1,12 @@
-import os
-import time
-from openai import OpenAI
-from dotenv import load_dotenv
+import asyncio
+import json
+from typing import List, NamedTuple, Optional
 
-# Обязательно загружаем .env в этом файле
-load_dotenv()
+from config.settings import SUMMARY_TOKEN_BUDGET, SUMMARY_MAX_PARALLEL
+from core.llm_cache import chat_completion_async
 
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("❌ Переменная окружения OPENAI_API_KEY не найдена!")
-
-client = OpenAI(api_key=api_key)
-
-def generate_summary(posts: list[str]) -> str:
-    """Генерирует сводку. Встроены повторы при таймаутах и безопасный фолбэк."""
-    if not posts:
-        return "⚠️ Ошибка: нет текстов для анализа."
-
-    combined_text = "\n".join(posts)
-
-    system_prompt = (
-        """
+SYSTEM_PROMPT = (
+    """
 Ты финансовый аналитик и контент-мейкер.
 На основе списка новостей сформируй связную, лаконичную, но живую сводку.
 Пиши так, чтобы текст было интересно читать даже тем, кто не эксперт.
@@ -34,31 +20,162 @@ def generate_summary(posts: list[str]) -> str:
 Обязательно придумывай креативный заголовок, ставь его в кавычки.
 Текст поста начинай с новой строки под заголовком.
 """
-    )
+)
+
+# Промпт map-шага: сжать часть новостей в факты для финальной сводки
+CHUNK_PROMPT = (
+    """
+Ты финансовый аналитик. Тебе дана часть ленты новостей.
+Выдели самые важные факты: события, цифры, компании, активы, решения регуляторов.
+Объединяй повторы, отбрасывай рекламу и малозначимое.
+Верни 5–12 коротких пунктов списком, без вступления и выводов.
+"""
+)
+
+# Промпт режима одного запроса: пост, заголовок, описание обложки и теги
+BUNDLE_PROMPT = SYSTEM_PROMPT + (
+    """
+Ответ верни в JSON по схеме:
+- headline: креативный заголовок без кавычек;
+- post: текст поста без заголовка, с хештегами в конце;
+- cover_description: 1–2 предложения об основной теме новостей для поиска фото;
+- search_tags: 6–10 коротких АНГЛИЙСКИХ фраз (1–3 слова) для поиска реального фото
+  на финансовую тему (trading floor, candlestick chart, central bank building, oil barrels);
+  без электроники и железа (computer, PSU, cable).
+"""
+)
 
+BUNDLE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "headline": {"type": "string"},
+        "post": {"type": "string"},
+        "cover_description": {"type": "string"},
+        "search_tags": {
+            "type": "array",
+            "items": {"type": "string"},
+            "minItems": 6,
+            "maxItems": 10,
+        },
+    },
+    "required": ["headline", "post", "cover_description", "search_tags"],
+    "additionalProperties": False,
+}
+
+# Меньше стольких тегов — ищем по фразам generate_search_candidates
+MIN_BUNDLE_TAGS = 3
+
+
+class PostBundle(NamedTuple):
+    summary: str  # заголовок в кавычках и текст, как у generate_summary
+    headline: str
+    cover_description: str
+    search_tags: List[str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая локальная оценка числа токенов без обращения к API.
+    Латиница в среднем ~4 символа на токен, кириллица и прочее — ~2.5;
+    оценка намеренно завышена, чтобы не выходить за бюджет.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    return int(ascii_chars / 4 + other_chars / 2.5) + 1
+
+
+def _split_into_chunks(posts: list[str], budget: int) -> list[list[str]]:
+    """Жадно раскладывает посты по кускам не больше `budget` токенов.
+    Пост длиннее бюджета обрезается, чтобы уместиться в кусок целиком.
+    """
+    chunks: list[list[str]] = []
+    current: list[str] = []
+    used = 0
+    for post in posts:
+        cost = estimate_tokens(post)
+        if cost > budget:
+            post = post[: int(len(post) * budget / cost)]
+            cost = estimate_tokens(post)
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(post)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _complete(system_prompt: str, user_text: str, model: str = "gpt-4o",
+                    temperature: float = 0.7, call: str = "summary", **params) -> str:
+    """Один запрос к модели с повторами при таймаутах; бросает последнюю ошибку.
+    Ответы берутся из кэша, если такой же запрос уже выполнялся.
+    """
     # Попробуем несколько раз на случай сетевых таймаутов
     attempts = 3
     backoff = 3.0
     last_err: Exception | None = None
     for i in range(1, attempts + 1):
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o",
+            content = await chat_completion_async(
+                call,
+                model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": combined_text},
+                    {"role": "user", "content": user_text},
                 ],
-                temperature=0.7,
+                temperature=temperature,
                 timeout=30,
+                **params,
             )
-            return response.choices[0].message.content.strip()
+            return content.strip()
         except Exception as e:
             # Считаем это временной ошибкой и повторим
             last_err = e
             # Для последних попыток не ждём
             if i < attempts:
-                time.sleep(backoff)
+                await asyncio.sleep(backoff)
                 backoff *= 1.6
+    raise last_err
+
+
+async def _compress(chunk: list[str], semaphore: asyncio.Semaphore) -> str:
+    async with semaphore:
+        return await _complete(CHUNK_PROMPT, "\n".join(chunk), temperature=0.3, call="summary_chunk")
+
+
+async def _reduce_to_budget(posts: list[str], budget: int) -> list[str]:
+    """Map-шаг: пока тексты не помещаются в один запрос, параллельно
+    сжимаем куски в списки фактов. Возвращает тексты, умещающиеся в бюджет.
+    """
+    semaphore = asyncio.Semaphore(max(1, SUMMARY_MAX_PARALLEL))
+    texts = posts
+    # Каждый раунд сжимает тексты в разы; три раунда хватает с запасом
+    for _ in range(3):
+        if estimate_tokens("\n".join(texts)) <= budget:
+            break
+        chunks = _split_into_chunks(texts, budget)
+        print(f"🧩 Сводка по частям: {len(chunks)} кусков по ≤{budget} токенов")
+        texts = await asyncio.gather(*(_compress(chunk, semaphore) for chunk in chunks))
+    return texts
+
+
+async def generate_summary_async(posts: list[str]) -> str:
+    """Генерирует сводку. Встроены повторы при таймаутах и безопасный фолбэк.
+    Если посты не помещаются в SUMMARY_TOKEN_BUDGET, они делятся на куски,
+    куски параллельно сжимаются в факты (map), а финальный запрос пишет
+    пост по этим фактам (reduce).
+    """
+    if not posts:
+        return "⚠️ Ошибка: нет текстов для анализа."
+
+    last_err: Exception | None = None
+    try:
+        texts = await _reduce_to_budget(posts, SUMMARY_TOKEN_BUDGET)
+        return await _complete(SYSTEM_PROMPT, "\n".join(texts))
+    except Exception as e:
+        last_err = e
 
     # Фолбэк: короткий дайджест по первым пунктам, чтобы не срывать выпуск
     try:
@@ -78,3 +195,62 @@ def generate_summary(posts: list[str]) -> str:
     except Exception:
         # В крайнем случае вернём исходную ошибку
         return f"⚠️ Ошибка генерации сводки: {last_err}"
+
+
+def generate_summary(posts: list[str]) -> str:
+    return asyncio.run(generate_summary_async(posts))
+
+
+def _parse_bundle(raw: str) -> Optional[PostBundle]:
+    """Проверяет JSON-ответ модели; None, если нет заголовка или текста.
+    Пустое описание обложки или мало тегов не считаются ошибкой —
+    их заменят отдельные функции.
+    """
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    headline = str(data.get("headline") or "").strip().strip('"«»“”').strip()
+    post = str(data.get("post") or "").strip()
+    if not headline or not post:
+        return None
+    cover = str(data.get("cover_description") or "").strip()
+    tags = data.get("search_tags")
+    tags = [str(t).strip() for t in tags if str(t).strip()] if isinstance(tags, list) else []
+    if len(tags) < MIN_BUNDLE_TAGS:
+        tags = []
+    return PostBundle(f'"{headline}"\n{post}', headline, cover, tags[:10])
+
+
+async def generate_post_bundle_async(posts: list[str]) -> Optional[PostBundle]:
+    """Один запрос со structured output вместо трёх последовательных
+    (сводка, промпт обложки, поисковые фразы). Длинные окна сначала
+    сжимаются так же, как в generate_summary. None при ошибке или
+    невалидном ответе — тогда вызывающий код идёт по обычному пути.
+    """
+    if not posts:
+        return None
+    try:
+        texts = await _reduce_to_budget(posts, SUMMARY_TOKEN_BUDGET)
+        raw = await _complete(
+            BUNDLE_PROMPT,
+            "\n".join(texts),
+            call="post_bundle",
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": "post_bundle", "strict": True, "schema": BUNDLE_SCHEMA},
+            },
+        )
+    except Exception as e:
+        print(f"⚠️ Ошибка генерации поста одним запросом: {e}")
+        return None
+    bundle = _parse_bundle(raw)
+    if bundle is None:
+        print("⚠️ Ответ модели не прошёл проверку схемы — обычная генерация сводки")
+    return bundle
+
+
+def generate_post_bundle(posts: list[str]) -> Optional[PostBundle]:
+    return asyncio.run(generate_post_bundle_async(posts))
@@ -7,13 +7,17 @@ DB_PATH = "data/processed.db"
 os.makedirs("data", exist_ok=True)
 
 conn = sqlite3.connect(DB_PATH)
+# WAL сохраняется в файле БД: читатели не блокируются записью сборщика
+conn.execute("PRAGMA journal_mode=WAL")
 cursor = conn.cursor()
 
+# Отпечатки обработанных постов; старая схема (message_hash TEXT)
+# мигрируется автоматически в utils/post_registry
 cursor.execute("""
     CREATE TABLE IF NOT EXISTS processed (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        message_hash TEXT UNIQUE
-    )
+        fingerprint BLOB PRIMARY KEY,
+        first_seen INTEGER NOT NULL
+    ) WITHOUT ROWID
 """)
 
 conn.commit()
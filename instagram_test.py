@@ -3,7 +3,7 @@ import requests
 from time import sleep
 
 # Настройки
-IMAGE_PATH = "data/final_cover.png"
+IMAGE_PATH = "data/final_cover.jpg"
 CAPTION = "💹 Тестовая публикация в Instagram через FreeImage.host"
 IG_USER_ID = "17841470355080685"  # Твой IG user ID
 # IG_ACCESS_TOKEN = "EAAPawYyoSuIBO9oCQ6BM7ZByuvcroIBWi7h9bjSBGXIR4AC6dcTUlfVREjJLrIQkruusgIisPwgBJEKNCl4Yvs0HYhRhkSAGcwZCdBmLwigLqCJUr0bo4uK0ArKIfgejk2EnQq0QMLShuCu4FS8rFGdRTM8XiPvuRhG4jtArjJLjX0GayevVNjYpmeeh1qLHJbAw5RCC1I"
@@ -1,16 +1,21 @@
 import argparse
 import asyncio
 import os
+import time
 
 from utils.time_windows import get_time_range_for_mode
-from core.news_collector import fetch_new_posts
-from core.text_processor import generate_summary
-from core.image_prompt_generator import generate_image_prompt
-from core.image_generator import generate_image
-from core.publisher import publish_to_telegram
-from core.instagram_publisher import publish_to_instagram
-from core.freeimage_uploader import upload_to_freeimage
+from core.news_collector import fetch_new_posts, fetch_buffered_posts
+from core.post_ranker import rank_posts
+from core.text_processor import generate_summary_async, generate_post_bundle_async
+from core.image_prompt_generator import generate_image_prompt_async
+from core.image_generator import generate_image_async
+from core.publisher import publish_to_telegram_async
+from core.instagram_publisher import publish_to_instagram_async
+from core.freeimage_uploader import upload_to_freeimage_async
+from core.clients import close_async_clients
+from utils.image_tools import render_renditions
 from utils.post_logger import log_post_event
+from config.settings import COLLECT_SOURCE, SUMMARY_BUNDLE
 
 
 def parse_args():
@@ -29,7 +34,84 @@ def parse_args():
     return parser.parse_args()
 
 
+async def _publish_telegram(mode: str, summary: str, image_path: str) -> bool:
+    print("📣 Публикация в Telegram...")
+    try:
+        await publish_to_telegram_async(summary, image_path)
+        print("✅ Пост опубликован в Telegram")
+    except Exception as e:
+        print(f"❌ Ошибка публикации в Telegram: {e}")
+        log_post_event({
+            "mode": mode,
+            "stage": "telegram",
+            "status": "error",
+            "error": str(e),
+        })
+        return False
+    log_post_event({
+        "mode": mode,
+        "stage": "telegram",
+        "status": "ok",
+    })
+    return True
+
+
+async def _publish_instagram(mode: str, summary: str, image_path: str):
+    """Загрузка на FreeImage.host и публикация в Instagram. image_path —
+    уже подготовленный 4:5 рендишен, поэтому загрузка одна.
+    Возвращает ссылку на изображение или None при ошибке.
+    """
+    # Загрузка изображения на FreeImage.host
+    try:
+        print("☁️ Загружаем обложку на FreeImage.host...")
+        image_url = await upload_to_freeimage_async(image_path)
+        print(f"🔗 Ссылка на изображение: {image_url}\n")
+    except Exception as e:
+        print(f"❌ Ошибка загрузки на хостинг: {e}")
+        log_post_event({
+            "mode": mode,
+            "stage": "upload",
+            "status": "error",
+            "error": str(e),
+        })
+        return None
+    log_post_event({
+        "mode": mode,
+        "stage": "upload",
+        "status": "ok",
+        "image_url": image_url,
+    })
+
+    # Публикация в Instagram
+    print("📸 Публикация в Instagram...")
+    try:
+        await publish_to_instagram_async(image_url, summary)
+        print("✅ Пост опубликован в Instagram")
+    except Exception as e:
+        print(f"❌ Ошибка публикации в Instagram: {e}")
+        log_post_event({
+            "mode": mode,
+            "stage": "instagram",
+            "status": "error",
+            "error": str(e),
+        })
+        return None
+    log_post_event({
+        "mode": mode,
+        "stage": "instagram",
+        "status": "ok",
+    })
+    return image_url
+
+
 async def main():
+    try:
+        await run_pipeline()
+    finally:
+        await close_async_clients()
+
+
+async def run_pipeline():
     args = parse_args()
     mode = args.mode
 
@@ -37,12 +119,16 @@ async def main():
     start_time, end_time = get_time_range_for_mode(mode)
     print(f"🕒 Временной диапазон по Москве: {start_time} → {end_time}\n")
 
-    # Сбор новостей
-    raw_posts = await fetch_new_posts(
-        start_time,
-        end_time,
-        limit_per_channel=10
-    )
+    # Сбор новостей: из буфера stream_collector или запросом истории
+    if COLLECT_SOURCE == "buffer":
+        raw_posts = await asyncio.to_thread(fetch_buffered_posts, start_time, end_time, with_meta=True)
+    else:
+        raw_posts = await fetch_new_posts(
+            start_time,
+            end_time,
+            limit_per_channel=10,
+            with_meta=True,
+        )
     if not raw_posts:
         if not args.force:
             print("⚠️ Нет новостей за указанный период.")
@@ -69,16 +155,37 @@ async def main():
             "mode": mode,
             "stage": "collect",
             "status": "ok",
+            "source": COLLECT_SOURCE,
             "count": len(raw_posts),
             "start_time": str(start_time),
             "end_time": str(end_time),
         })
 
+    # Отбор самых информативных постов перед отправкой в GPT
+    if raw_posts:
+        started = time.perf_counter()
+        ranked = rank_posts(raw_posts)
+        log_post_event({
+            "mode": mode,
+            "stage": "rank",
+            "status": "ok",
+            "count": len(raw_posts),
+            "kept": len(ranked),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        raw_posts = ranked
+
     # Генерация текста
     print("📝 GPT формирует связную сводку...")
+    bundle = None
     try:
-        if raw_posts:
-            summary = generate_summary(raw_posts)
+        if raw_posts and SUMMARY_BUNDLE:
+            # Сводка, описание обложки и теги поиска одним запросом
+            bundle = await generate_post_bundle_async([p.text for p in raw_posts])
+        if bundle:
+            summary = bundle.summary
+        elif raw_posts:
+            summary = await generate_summary_async([p.text for p in raw_posts])
         else:
             # Принудительный фолбэк, если постов нет — краткий шаблон
             summary = (
@@ -102,11 +209,15 @@ async def main():
         "stage": "summary",
         "status": "ok",
         "chars": len(summary or ""),
+        "bundle": bundle is not None,
     })
 
-    # Генерация промпта для изображения
+    # Генерация промпта для изображения (в режиме bundle он уже готов)
     print("🎨 Генерация промпта...")
-    prompt = generate_image_prompt(summary)
+    if bundle and bundle.cover_description:
+        prompt = bundle.cover_description
+    else:
+        prompt = await generate_image_prompt_async(summary)
     print(f"\n🧠 GPT промпт:\n{prompt}\n")
     log_post_event({
         "mode": mode,
@@ -117,10 +228,10 @@ async def main():
     })
 
     # Генерация изображения
-    image_path = "data/final_cover.png"
+    image_path = "data/final_cover.jpg"
     print("\n🖼 ️Генерация обложки...")
     try:
-        image_path = generate_image(prompt)
+        image_path = await generate_image_async(prompt, candidates=bundle.search_tags if bundle else None)
         print(f"✅ Обложка сохранена: {image_path}\n")
     except Exception as e:
         print(f"❌ Ошибка генерации обложки, прерывание публикации.\n{e}")
@@ -136,6 +247,7 @@ async def main():
     if not image_path or not os.path.exists(image_path):
         print("⚠️ Обложка не сгенерирована — используем резервное изображение.")
         fallback_candidates = [
+            "data/final_cover.jpg",
             "data/final_cover.png",
             "data/logo.jpg",
         ]
@@ -170,68 +282,23 @@ async def main():
             "path": image_path,
         })
 
-    # Загрузка изображения на FreeImage.host
-    try:
-        print("☁️ Загружаем обложку на FreeImage.host...")
-        image_url = upload_to_freeimage(image_path)
-        print(f"🔗 Ссылка на изображение: {image_url}\n")
-    except Exception as e:
-        print(f"❌ Ошибка загрузки на хостинг: {e}")
-        log_post_event({
-            "mode": mode,
-            "stage": "upload",
-            "status": "error",
-            "error": str(e),
-        })
-        return
-    log_post_event({
-        "mode": mode,
-        "stage": "upload",
-        "status": "ok",
-        "image_url": image_url,
-    })
-
-    # Публикация в Telegram
-    print("📣 Публикация в Telegram...")
+    # Рендишены для обеих площадок из одного декодирования (обычно уже
+    # в кэше после generate_image); при ошибке публикуем исходный файл
     try:
-        publish_to_telegram(summary, image_path)
-        print("✅ Пост опубликован в Telegram")
+        renditions = await asyncio.to_thread(render_renditions, image_path)
+        telegram_path, instagram_path = renditions["telegram"], renditions["ig_portrait"]
     except Exception as e:
-        print(f"❌ Ошибка публикации в Telegram: {e}")
-        log_post_event({
-            "mode": mode,
-            "stage": "telegram",
-            "status": "error",
-            "error": str(e),
-        })
-    else:
-        log_post_event({
-            "mode": mode,
-            "stage": "telegram",
-            "status": "ok",
-        })
+        print(f"⚠️ Не удалось подготовить рендишены обложки: {e}")
+        telegram_path = instagram_path = image_path
 
-    # Публикация в Instagram
-    print("📸 Публикация в Instagram...")
-    try:
-        # Передаём путь к локальному файлу для корректной обработки aspect ratio
-        publish_to_instagram(image_url, summary, image_path)
-        print("✅ Пост опубликован в Instagram")
-    except Exception as e:
-        print(f"❌ Ошибка публикации в Instagram: {e}")
-        log_post_event({
-            "mode": mode,
-            "stage": "instagram",
-            "status": "error",
-            "error": str(e),
-        })
+    # Telegram публикуется с локального файла и не ждёт загрузки на хостинг:
+    # обе ветки идут одновременно в одном цикле событий
+    _, image_url = await asyncio.gather(
+        _publish_telegram(mode, summary, telegram_path),
+        _publish_instagram(mode, summary, instagram_path),
+    )
+    if image_url is None:
         return
-    else:
-        log_post_event({
-            "mode": mode,
-            "stage": "instagram",
-            "status": "ok",
-        })
 
     # Финальный успешный лог
     log_post_event({
@@ -9,6 +9,16 @@ def run_job(mode):
     print(f"🕒 Запуск задачи для режима: {mode}")
     subprocess.run(["python", "main.py", "--mode", mode])
 
+
+def refill_covers():
+    print("🗂 Пополнение пула обложек")
+    subprocess.run(["python", "-m", "core.cover_pool"])
+
+
+def sweep_covers():
+    print("🧹 Сверка data/covers с реестром")
+    subprocess.run(["python", "-m", "core.cover_cache"])
+
 tz = pytz.timezone("Europe/Moscow")
 scheduler = BlockingScheduler(timezone=tz)
 
@@ -21,5 +31,11 @@ scheduler.add_job(run_job, CronTrigger(hour=13, minute=15), args=["midday"], nam
 # Вечерний пост — 23:15 по Москве
 scheduler.add_job(run_job, CronTrigger(hour=23, minute=15), args=["evening"], name="evening_news")
 
+# Пул обложек — каждые 3 часа в :40, в стороне от публикаций в :15
+scheduler.add_job(refill_covers, CronTrigger(hour="*/3", minute=40), name="cover_pool_refill")
+
+# Сверка хранилища обложек — раз в сутки, ночью
+scheduler.add_job(sweep_covers, CronTrigger(hour=4, minute=50), name="covers_sweep")
+
 print("⏳ Планировщик запущен... Ждём следующего запуска.")
 scheduler.start()
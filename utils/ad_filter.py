@@ -0,0 +1,101 @@
+# utils/ad_filter.py
+
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Pattern
+
+from config.settings import AD_WORDS_PATH
+
+
+# Используются, если файл с правилами отсутствует
+DEFAULT_RULES = [
+    "курс", "подпишись", "промокод", "обучение", "трейдинг", "вебинар",
+    "записаться", "тренинг", "морафон", "youtube", "appstore",
+]
+
+
+def load_rules(path: Optional[str] = None) -> List[str]:
+    """Читает правила из файла (по одному на строку, # — комментарий)."""
+    try:
+        with open(path or AD_WORDS_PATH, encoding="utf-8") as f:
+            lines = [line.strip() for line in f]
+    except FileNotFoundError:
+        return list(DEFAULT_RULES)
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def _trie_regex(words: Iterable[str]) -> Optional[str]:
+    """Собирает из слов регулярку-префиксное дерево: общие префиксы
+    вынесены, поэтому движок на каждой позиции проверяет не все слова
+    подряд, а идёт по одной ветке.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    if not trie:
+        return None
+
+    def build(node: dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            # Слово может закончиться здесь, а может продолжиться
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+def compile_rules(rules: Iterable[str]) -> Optional[Pattern]:
+    """Компилирует правила в одну регулярку для уже приведённого к нижнему
+    регистру текста. Возвращает None для пустого набора правил.
+    """
+    substrings, words, stems = set(), set(), set()
+    for rule in rules:
+        rule = rule.strip().lower()
+        if rule.startswith("="):
+            bucket, rule = words, rule[1:]
+        elif rule.endswith("*"):
+            bucket, rule = stems, rule[:-1]
+        else:
+            bucket = substrings
+        if rule:
+            bucket.add(rule)
+
+    parts = []
+    trie = _trie_regex(substrings)
+    if trie:
+        parts.append(trie)
+    trie = _trie_regex(words)
+    if trie:
+        parts.append(rf"\b{trie}\b")
+    trie = _trie_regex(stems)
+    if trie:
+        parts.append(rf"\b{trie}")
+    if not parts:
+        return None
+    return re.compile("|".join(parts))
+
+
+@lru_cache(maxsize=1)
+def get_ad_pattern() -> Optional[Pattern]:
+    """Скомпилированный фильтр по AD_WORDS_PATH (собирается один раз)."""
+    return compile_rules(load_rules())
+
+
+def find_ad_term(text: str) -> Optional[str]:
+    """Возвращает первый найденный рекламный термин или None."""
+    pattern = get_ad_pattern()
+    if pattern is None or not text:
+        return None
+    match = pattern.search(text.lower())
+    return match.group(0) if match else None
+
+
+def is_advertisement(text: str) -> bool:
+    return find_ad_term(text) is not None
@@ -1,6 +1,15 @@
 # utils/hash_utils.py
 
 import hashlib
+import re
+import unicodedata
+
+# Ссылки, упоминания и невидимые символы не меняют смысл поста
+_URL_RE = re.compile(r"(?:https?://|www\.|t\.me/)\S+", re.IGNORECASE)
+_MENTION_RE = re.compile(r"@\w+")
+_INVISIBLE_RE = re.compile("[\u00ad\u200b-\u200f\u2060\ufeff]")
+_SPACES_RE = re.compile(r"\s+")
+
 
 def get_hash(text: str) -> str:
     """
@@ -8,3 +17,23 @@ def get_hash(text: str) -> str:
     Используется для проверки, был ли пост уже обработан.
     """
     return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Приводит текст к каноническому виду перед сравнением: Unicode NFKC,
+    без невидимых символов, ссылок и @упоминаний, пробелы схлопнуты.
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    text = _INVISIBLE_RE.sub("", text)
+    text = _URL_RE.sub(" ", text)
+    text = _MENTION_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def get_fingerprint(text: str) -> bytes:
+    """
+    Возвращает 16-байтовый отпечаток (BLAKE2b) нормализованного текста.
+    Используется как ключ таблицы processed.
+    """
+    return hashlib.blake2b(normalize_text(text).encode('utf-8'), digest_size=16).digest()
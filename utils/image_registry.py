@@ -1,53 +1,374 @@
 import os
 import sqlite3
-from typing import Optional
+import threading
+import time
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
 import hashlib
 
+from utils.phash import dhash_file
+from utils.simhash import SimHashIndex, hamming, to_signed, to_unsigned
 
 DB_PATH = os.path.join("data", "processed.db")
 
+# Лимит SQLite на число параметров в одном запросе (старые сборки — 999)
+_MAX_VARS = 900
 
-def _ensure_db() -> None:
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS used_images (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                provider TEXT NOT NULL,
-                image_id TEXT NOT NULL,
-                image_url TEXT,
-                query TEXT,
-                used_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(provider, image_id)
-            );
-            """
-        )
-        # Таблица для уже сохранённых локальных файлов (по имени)
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS saved_files (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT NOT NULL UNIQUE,
-                file_hash TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            );
-            """
+
+class SavedFile(NamedTuple):
+    filename: str
+    file_hash: Optional[str]
+    size: Optional[int]
+    last_access: Optional[float]
+
+
+class PoolEntry(NamedTuple):
+    provider: str
+    image_id: str
+    theme: str
+    path: str
+    image_url: str
+    query: str
+    tags: str
+    file_hash: str
+    dhash: Optional[int]
+    size: int
+    added_at: float
+
+
+class ImageRegistry:
+    """Учёт использованных изображений и сохранённых обложек.
+
+    Одно долгоживущее соединение (WAL) на процесс; схема создаётся один
+    раз в конструкторе. Запросы с постоянным текстом SQL sqlite3 кэширует
+    как подготовленные выражения. Соединение общее для потоков
+    (поиск обложки ходит в реестр через asyncio.to_thread), поэтому
+    обращения сериализуются блокировкой.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._ensure_schema()
+        # Индекс dHash сохранённых обложек строится при первом поиске
+        self._dhash_index: Optional[SimHashIndex] = None
+
+    def _ensure_schema(self) -> None:
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS used_images (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    provider TEXT NOT NULL,
+                    image_id TEXT NOT NULL,
+                    image_url TEXT,
+                    query TEXT,
+                    used_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(provider, image_id)
+                );
+                """
+            )
+            # Таблица для уже сохранённых локальных файлов (по имени)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS saved_files (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT NOT NULL UNIQUE,
+                    file_hash TEXT,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                );
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_saved_files_hash ON saved_files(file_hash)"
+            )
+            # dHash обложки (int64); колонка добавлена позже — мигрируем
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(saved_files)")}
+            if "dhash" not in columns:
+                self._conn.execute("ALTER TABLE saved_files ADD COLUMN dhash INTEGER")
+            # Учёт места (core.cover_cache): размер файла с рендишенами,
+            # последняя публикация и отметка об удалении файла. Строки
+            # удалённых обложек остаются — по ним работает дедупликация
+            for column, decl in (("size", "INTEGER"), ("last_access", "REAL"), ("removed_at", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE saved_files ADD COLUMN {column} {decl}")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_saved_files_lru "
+                "ON saved_files(last_access) WHERE removed_at IS NULL"
+            )
+            # Заранее скачанные и проверенные обложки (core.cover_pool)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cover_pool (
+                    provider TEXT NOT NULL,
+                    image_id TEXT NOT NULL,
+                    theme TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    image_url TEXT,
+                    query TEXT,
+                    tags TEXT,
+                    file_hash TEXT,
+                    dhash INTEGER,
+                    size INTEGER NOT NULL,
+                    added_at REAL NOT NULL,
+                    PRIMARY KEY (provider, image_id)
+                );
+                """
+            )
+
+    def filter_unused(self, provider: str, image_ids: Iterable[str]) -> Set[str]:
+        """Те из image_ids, что ещё не использовались: вся страница
+        выдачи проверяется одним запросом (кусками по _MAX_VARS).
+        """
+        ids = list(dict.fromkeys(str(i) for i in image_ids if i))
+        used = set()
+        with self._lock:
+            for i in range(0, len(ids), _MAX_VARS):
+                chunk = ids[i:i + _MAX_VARS]
+                placeholders = ",".join("?" * len(chunk))
+                cur = self._conn.execute(
+                    "SELECT image_id FROM used_images "
+                    f"WHERE provider=? AND image_id IN ({placeholders})",
+                    [provider, *chunk],
+                )
+                used.update(row[0] for row in cur.fetchall())
+        return set(ids) - used
+
+    def is_used(self, provider: str, image_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT 1 FROM used_images WHERE provider=? AND image_id=? LIMIT 1",
+                (provider, image_id),
+            )
+            return cur.fetchone() is not None
+
+    def mark_used(
+        self,
+        provider: str,
+        image_id: str,
+        image_url: Optional[str],
+        query: Optional[str],
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO used_images("
+                "provider, image_id, image_url, query) VALUES(?, ?, ?, ?)",
+                (provider, image_id, image_url, query),
+            )
+
+    def recent_queries(self, provider: str, limit: int) -> List[str]:
+        """Запросы, которыми найдены последние limit использованных фото."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query FROM used_images WHERE provider=? AND query IS NOT NULL "
+                "ORDER BY id DESC LIMIT ?",
+                (provider, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def is_file_saved(self, filename: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT 1 FROM saved_files WHERE filename=? LIMIT 1", (filename,)
+            )
+            return cur.fetchone() is not None
+
+    def mark_file_saved(
+        self,
+        filename: str,
+        file_hash: Optional[str] = None,
+        dhash: Optional[int] = None,
+        size: Optional[int] = None,
+        last_access: Optional[float] = None,
+    ) -> None:
+        """file_hash — SHA-256 скачанного оригинала (так его сверяет
+        has_file_hash); без него хэш считается по сохранённому файлу.
+        dhash — перцептивный хеш для find_similar; size — занятое место
+        для бюджета data/covers. Повторная запись того же имени обновляет
+        строку и снимает отметку об удалении.
+        """
+        if file_hash is None:
+            try:
+                with open(filename, 'rb') as f:
+                    file_hash = hashlib.sha256(f.read()).hexdigest()
+            except Exception:
+                pass
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO saved_files(filename, file_hash, dhash, size, last_access) "
+                "VALUES(?, ?, ?, ?, ?) "
+                "ON CONFLICT(filename) DO UPDATE SET "
+                "file_hash=COALESCE(excluded.file_hash, file_hash), "
+                "dhash=COALESCE(excluded.dhash, dhash), "
+                "size=COALESCE(excluded.size, size), "
+                "last_access=excluded.last_access, removed_at=NULL",
+                (
+                    filename, file_hash, to_signed(dhash) if dhash is not None else None,
+                    size, last_access if last_access is not None else time.time(),
+                ),
+            )
+            if dhash is not None and self._dhash_index is not None:
+                self._dhash_index.add(dhash)
+
+    def files_usage(self) -> Tuple[int, int]:
+        """Число и суммарный размер обложек, чьи файлы на диске."""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM saved_files WHERE removed_at IS NULL"
+            ).fetchone()
+        return count, total
+
+    def live_files(self, limit: int = -1, offset: int = 0) -> List[SavedFile]:
+        """Обложки на диске от давно не публиковавшихся к свежим."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename, file_hash, size, last_access FROM saved_files "
+                "WHERE removed_at IS NULL ORDER BY last_access LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [SavedFile(*row) for row in rows]
+
+    def tombstone_files(self, filenames: Iterable[str]) -> None:
+        """Отмечает файлы удалёнными; хэши остаются для has_file_hash и
+        find_similar.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE saved_files SET removed_at=? WHERE filename=? AND removed_at IS NULL",
+                [(now, filename) for filename in filenames],
+            )
+
+    def live_hashes(self) -> Set[str]:
+        """Хэши содержимого обложек на диске: сохранённых и из пула."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_hash FROM saved_files WHERE removed_at IS NULL AND file_hash IS NOT NULL "
+                "UNION SELECT file_hash FROM cover_pool WHERE file_hash IS NOT NULL"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def _load_dhash_index(self, max_distance: int) -> SimHashIndex:
+        """Строит индекс под порог max_distance из saved_files; для
+        записей до появления колонки dhash хеш досчитывается по файлу,
+        если тот ещё на диске.
+        """
+        rows = self._conn.execute("SELECT id, filename, dhash FROM saved_files").fetchall()
+        values = []
+        backfill = []
+        for row_id, filename, value in rows:
+            if value is None:
+                if not os.path.exists(filename):
+                    continue
+                value = dhash_file(filename)
+                if value is None:
+                    continue
+                backfill.append((to_signed(value), row_id))
+                values.append(value)
+            else:
+                values.append(to_unsigned(value))
+        if backfill:
+            with self._conn:
+                self._conn.executemany("UPDATE saved_files SET dhash=? WHERE id=?", backfill)
+        return SimHashIndex(max_distance, values)
+
+    def find_similar(self, dhash: int, max_distance: int) -> Optional[int]:
+        """Расстояние до визуально похожей сохранённой обложки
+        (<= max_distance) или None. Кандидаты берутся только из общих
+        LSH-корзин, поэтому проверка против десятков тысяч обложек
+        занимает доли миллисекунды. Полосы индекса строятся под
+        max_distance (при другом пороге индекс пересобирается), так что
+        полнота гарантирована при любом пороге.
+        """
+        with self._lock:
+            index = self._dhash_index
+            if index is None or index.band_distance != max_distance:
+                index = self._dhash_index = self._load_dhash_index(max_distance)
+            match = index.find(dhash)
+        return hamming(dhash, match) if match is not None else None
+
+    def has_file_hash(self, file_hash: str) -> bool:
+        """Return True if a file with the given content hash was already saved."""
+        if not file_hash:
+            return False
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT 1 FROM saved_files WHERE file_hash=? LIMIT 1",
+                (file_hash,),
+            )
+            return cur.fetchone() is not None
+
+    def pool_add(
+        self,
+        provider: str,
+        image_id: str,
+        theme: str,
+        path: str,
+        image_url: str,
+        query: str,
+        tags: str,
+        file_hash: str,
+        dhash: Optional[int],
+        size: int,
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cover_pool(provider, image_id, theme, path, "
+                "image_url, query, tags, file_hash, dhash, size, added_at) "
+                "VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    provider, image_id, theme, path, image_url, query, tags, file_hash,
+                    to_signed(dhash) if dhash is not None else None, size, time.time(),
+                ),
+            )
+
+    def pool_entries(self, theme: Optional[str] = None) -> List[PoolEntry]:
+        """Записи пула (по теме или все), от старых к новым."""
+        sql = (
+            "SELECT provider, image_id, theme, path, image_url, query, tags, "
+            "file_hash, dhash, size, added_at FROM cover_pool"
         )
-        conn.commit()
+        with self._lock:
+            if theme is None:
+                rows = self._conn.execute(sql + " ORDER BY added_at").fetchall()
+            else:
+                rows = self._conn.execute(sql + " WHERE theme=? ORDER BY added_at", (theme,)).fetchall()
+        return [
+            PoolEntry(*row[:8], to_unsigned(row[8]) if row[8] is not None else None, *row[9:])
+            for row in rows
+        ]
+
+    def pool_remove(self, provider: str, image_ids: Iterable[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM cover_pool WHERE provider=? AND image_id=?",
+                [(provider, image_id) for image_id in image_ids],
+            )
+
+
+_registry: Optional[ImageRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_image_registry() -> ImageRegistry:
+    """Общий реестр процесса; создаётся при первом обращении."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ImageRegistry()
+        return _registry
+
+
+# Прежний функциональный интерфейс поверх общего реестра
+
+def filter_unused(provider: str, image_ids: Iterable[str]) -> Set[str]:
+    return get_image_registry().filter_unused(provider, image_ids)
 
 
 def is_used(provider: str, image_id: str) -> bool:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.execute(
-            (
-                "SELECT 1 FROM used_images "
-                "WHERE provider=? AND image_id=? LIMIT 1"
-            ),
-            (provider, image_id),
-        )
-        return cur.fetchone() is not None
+    return get_image_registry().is_used(provider, image_id)
 
 
 def mark_used(
@@ -56,52 +377,25 @@ def mark_used(
     image_url: Optional[str],
     query: Optional[str],
 ) -> None:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            (
-                "INSERT OR IGNORE INTO used_images("
-                "provider, image_id, image_url, query) VALUES(?, ?, ?, ?)"
-            ),
-            (provider, image_id, image_url, query),
-        )
-        conn.commit()
+    get_image_registry().mark_used(provider, image_id, image_url, query)
 
 
 def is_file_saved(filename: str) -> bool:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.execute(
-            "SELECT 1 FROM saved_files WHERE filename=? LIMIT 1", (filename,)
-        )
-        return cur.fetchone() is not None
-
-
-def mark_file_saved(filename: str) -> None:
-    _ensure_db()
-    # Опционально считаем хэш, чтобы при совпадении содержимого можно анализировать
-    file_hash = None
-    try:
-        with open(filename, 'rb') as f:
-            file_hash = hashlib.sha256(f.read()).hexdigest()
-    except Exception:
-        pass
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "INSERT OR IGNORE INTO saved_files(filename, file_hash) VALUES(?, ?)",
-            (filename, file_hash),
-        )
-        conn.commit()
+    return get_image_registry().is_file_saved(filename)
+
+
+def mark_file_saved(
+    filename: str,
+    file_hash: Optional[str] = None,
+    dhash: Optional[int] = None,
+    size: Optional[int] = None,
+) -> None:
+    get_image_registry().mark_file_saved(filename, file_hash, dhash, size)
+
+
+def find_similar(dhash: int, max_distance: int) -> Optional[int]:
+    return get_image_registry().find_similar(dhash, max_distance)
 
 
 def has_file_hash(file_hash: str) -> bool:
-    """Return True if a file with the given content hash was already saved."""
-    if not file_hash:
-        return False
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.execute(
-            "SELECT 1 FROM saved_files WHERE file_hash=? LIMIT 1",
-            (file_hash,),
-        )
-        return cur.fetchone() is not None
+    return get_image_registry().has_file_hash(file_hash)
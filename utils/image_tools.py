@@ -1,5 +1,17 @@
+import hashlib
 import os
-from PIL import Image
+from typing import Dict, Optional
+
+# Рендишены обложки: имя -> (размер, холст с полями?, качество JPEG).
+# telegram — вписанный в 1280 по длинной стороне JPEG (Telegram всё
+# равно пережимает фото до 1280), ig_* — форматы Instagram на чёрном поле.
+RENDITIONS = {
+    "telegram":     ((1280, 1280), False, 85),
+    "ig_portrait":  ((1080, 1350), True, 90),
+    "ig_square":    ((1080, 1080), True, 90),
+    "ig_landscape": ((1080, 566), True, 90),
+}
+RENDITIONS_DIR = os.path.join("data", "renditions")
 
 def prepare_for_instagram(input_path: str, output_path: str = "data/ig_cover.jpg", variant: str = "portrait") -> str:
     """
@@ -17,6 +29,8 @@ def prepare_for_instagram(input_path: str, output_path: str = "data/ig_cover.jpg
     if variant not in targets:
         raise ValueError("variant must be one of: portrait, square, landscape")
 
+    from PIL import Image
+
     tw, th = targets[variant]
     im = Image.open(input_path).convert("RGB")
     # Вписываем в целевой прямоугольник
@@ -31,3 +45,66 @@ def prepare_for_instagram(input_path: str, output_path: str = "data/ig_cover.jpg
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     canvas.save(output_path, "JPEG", quality=90, optimize=True, progressive=True)
     return output_path
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 содержимого файла (hex), читается кусками."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def rendition_paths(content_hash: str) -> Dict[str, str]:
+    """Пути рендишенов для исходника с данным SHA-256."""
+    directory = os.path.join(RENDITIONS_DIR, content_hash[:32])
+    return {name: os.path.join(directory, f"{name}.jpg") for name in RENDITIONS}
+
+
+def render_renditions(source_path: str, content_hash: Optional[str] = None) -> Dict[str, str]:
+    """Все рендишены (RENDITIONS) из одного декодирования исходника.
+
+    Результат кэшируется по хэшу содержимого в data/renditions/<hash>/:
+    если все файлы уже есть, исходник не декодируется вовсе. JPEG сразу
+    декодируется в уменьшенном масштабе (draft), затем всё приводится к
+    RGB и уменьшается целочисленно (reduce) — но не мельче, чем нужно
+    самому крупному рендишену. Возвращает {имя: путь}.
+    """
+    paths = rendition_paths(content_hash or file_sha256(source_path))
+    if all(os.path.exists(p) for p in paths.values()):
+        # Отметка свежести для ротации рендишенов
+        try:
+            os.utime(os.path.dirname(paths["telegram"]))
+        except OSError:
+            pass
+        return paths
+
+    from PIL import Image
+
+    with Image.open(source_path) as im:
+        w, h = im.size
+        # Масштаб, нужный самому крупному рендишену (вписывание, без увеличения)
+        scale = min(1.0, max(min(tw / w, th / h) for (tw, th), _, _ in RENDITIONS.values()))
+        need = (max(1, int(w * scale + 0.5)), max(1, int(h * scale + 0.5)))
+        if im.format == "JPEG":
+            im.draft("RGB", need)
+        # reduce не работает с палитрой (GIF, PNG-P) — сначала в RGB
+        base = im.convert("RGB")
+        factor = min(base.width // need[0], base.height // need[1])
+        if factor >= 2:
+            base = base.reduce(factor)
+
+    os.makedirs(os.path.dirname(paths["telegram"]), exist_ok=True)
+    for name, ((tw, th), letterbox, quality) in RENDITIONS.items():
+        out = base.copy()
+        out.thumbnail((tw, th), Image.LANCZOS)
+        if letterbox:
+            canvas = Image.new("RGB", (tw, th), (0, 0, 0))
+            canvas.paste(out, ((tw - out.width) // 2, (th - out.height) // 2))
+            out = canvas
+        # Через временный файл: параллельный читатель не увидит половину JPEG
+        tmp_path = paths[name] + ".tmp"
+        out.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+        os.replace(tmp_path, paths[name])
+    return paths
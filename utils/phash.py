@@ -0,0 +1,37 @@
+# utils/phash.py
+#
+# Перцептивный хеш обложек (dHash): одно и то же фото Pixabay в другом
+# размере или с другим кадрированием даёт близкий по Хэммингу хеш при
+# разных байтах. Поиск похожих — utils.simhash.SimHashIndex (те же
+# 64 бита, LSH-корзины по 8 полосам).
+
+from typing import Optional
+
+# 9x8 пикселей -> 8x8 сравнений соседей = 64 бита
+HASH_SIZE = 8
+
+
+def dhash(image) -> int:
+    """64-битный dHash изображения PIL: знак разности яркости соседних
+    пикселей в уменьшенной копии 9x8 в оттенках серого.
+    """
+    import numpy as np
+    from PIL import Image
+
+    small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash_file(path: str) -> Optional[int]:
+    """dHash файла или None, если его не удалось декодировать."""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            # draft: JPEG декодируется сразу в уменьшенном масштабе
+            img.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+            return dhash(img)
+    except Exception:
+        return None
@@ -0,0 +1,460 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config.settings import NEAR_DUP_MAX_DISTANCE
+from utils.simhash import band_widths, bands, to_signed, to_unsigned
+
+
+DB_PATH = os.path.join("data", "processed.db")
+
+# Лимит SQLite на число параметров в одном запросе (старые сборки — 999)
+_MAX_VARS = 900
+
+_conn: Optional[sqlite3.Connection] = None
+# Соединение общее для всех потоков (сборщик вызывается и из
+# asyncio.to_thread); RLock — функции реестра вызываются и внутри
+# transaction()
+_lock = threading.RLock()
+# Есть ли ещё таблица processed_legacy со старыми SHA-256 (см. _migrate_processed)
+_legacy_present = False
+
+
+def get_connection() -> sqlite3.Connection:
+    """Общее соединение с data/processed.db для сборщика новостей.
+    База работает в режиме WAL, чтобы запись сборщика не блокировала
+    чтение реестра изображений. Схема создаётся один раз при первом
+    обращении. Соединение не привязано к потоку: запросы к нему идут
+    под _lock (функции модуля берут его сами, внешний код — через
+    transaction()).
+    """
+    global _conn
+    with _lock:
+        if _conn is None:
+            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+            _conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+            _ensure_schema(_conn)
+            _sync_near_dup_layout(_conn)
+    return _conn
+
+
+@contextmanager
+def transaction():
+    """Одна транзакция на несколько вызовов с commit=False: держит _lock,
+    фиксирует изменения при выходе и откатывает при исключении.
+    """
+    with _lock, get_connection() as conn:
+        yield conn
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    global _legacy_present
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS registry_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        """
+    )
+    _migrate_processed(conn)
+    # 16-байтовые отпечатки нормализованного текста (utils.hash_utils.get_fingerprint)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS processed (
+            fingerprint BLOB PRIMARY KEY,
+            first_seen INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_processed_first_seen ON processed(first_seen)"
+    )
+    _legacy_present = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='processed_legacy'"
+    ).fetchone() is not None
+    # Последнее увиденное сообщение по каждому каналу
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS channel_watermarks (
+            channel TEXT PRIMARY KEY,
+            last_message_id INTEGER NOT NULL,
+            last_message_date TEXT,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+    # Начало окна, в котором знак был сдвинут: сообщения от него до
+    # last_message_date уже обработаны. Колонка добавлена позже — мигрируем
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(channel_watermarks)")}
+    if "window_start" not in columns:
+        conn.execute("ALTER TABLE channel_watermarks ADD COLUMN window_start TEXT")
+    # SimHash опубликованных постов и их LSH-корзины (полоса + ключ полосы)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS near_dup_index (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            simhash INTEGER NOT NULL,
+            created_at INTEGER NOT NULL
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS near_dup_buckets (
+            bucket INTEGER NOT NULL,
+            entry_id INTEGER NOT NULL,
+            PRIMARY KEY (bucket, entry_id)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_near_dup_created ON near_dup_index(created_at)"
+    )
+    # Буфер постов от core.stream_collector; main.py читает из него окно
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            message_id INTEGER NOT NULL,
+            posted_at REAL NOT NULL,
+            text TEXT NOT NULL,
+            consumed_at INTEGER,
+            UNIQUE(channel, message_id)
+        );
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_posts_posted_at ON posts(posted_at)"
+    )
+    # Разрешённые peer каналов: позволяют не вызывать get_entity каждый запуск
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS channel_peers (
+            channel TEXT PRIMARY KEY,
+            peer_id INTEGER NOT NULL,
+            access_hash INTEGER NOT NULL,
+            resolved_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+    conn.commit()
+
+
+def _migrate_processed(conn: sqlite3.Connection) -> None:
+    """Старая таблица processed(message_hash TEXT) переименовывается в
+    processed_legacy. SHA-256 сырого текста нельзя перевести в новые
+    отпечатки, поэтому legacy-хеши проверяются параллельно, пока не
+    истечёт PROCESSED_TTL_DAYS с момента миграции (см. compact_processed).
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(processed)")]
+    if "message_hash" not in columns:
+        return
+    with conn:
+        conn.execute("ALTER TABLE processed RENAME TO processed_legacy")
+        conn.execute(
+            "INSERT OR REPLACE INTO registry_meta (key, value) VALUES ('processed_legacy_since', ?)",
+            (str(int(time.time())),),
+        )
+    print("🗄 Таблица processed переведена на отпечатки; старые хеши в processed_legacy")
+
+
+def _select_known(conn: sqlite3.Connection, sql: str, values: List) -> set:
+    known = set()
+    for i in range(0, len(values), _MAX_VARS):
+        chunk = values[i:i + _MAX_VARS]
+        placeholders = ",".join("?" * len(chunk))
+        cur = conn.execute(sql.format(placeholders=placeholders), chunk)
+        known.update(row[0] for row in cur.fetchall())
+    return known
+
+
+# Сдвиг номера полосы в ключе корзины (полоса уже 32 бит)
+_BAND_SHIFT = 32
+
+
+def _buckets(value: int) -> List[int]:
+    return [(i << _BAND_SHIFT) | key for i, key in enumerate(bands(value, NEAR_DUP_MAX_DISTANCE))]
+
+
+def _sync_near_dup_layout(conn: sqlite3.Connection) -> None:
+    """Полосы корзин строятся под NEAR_DUP_MAX_DISTANCE: если порог
+    сменился с прошлого запуска (или корзины от старой схемы 8x8 бит),
+    корзины пересобираются из хранимых SimHash.
+    """
+    layout = ",".join(map(str, band_widths(NEAR_DUP_MAX_DISTANCE)))
+    row = conn.execute("SELECT value FROM registry_meta WHERE key='near_dup_layout'").fetchone()
+    if row is not None and row[0] == layout:
+        return
+    with conn:
+        conn.execute("DELETE FROM near_dup_buckets")
+        for entry_id, value in conn.execute("SELECT id, simhash FROM near_dup_index").fetchall():
+            conn.executemany(
+                "INSERT OR IGNORE INTO near_dup_buckets (bucket, entry_id) VALUES (?, ?)",
+                [(bucket, entry_id) for bucket in _buckets(to_unsigned(value))],
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO registry_meta (key, value) VALUES ('near_dup_layout', ?)",
+            (layout,),
+        )
+
+
+def filter_new_fingerprints(
+    fingerprints: Sequence[bytes],
+    legacy_hashes: Sequence[str] = (),
+) -> List[bytes]:
+    """Return the fingerprints (input order, unique) absent from `processed`.
+    `legacy_hashes` — параллельный список get_hash() тех же текстов: пока
+    жива processed_legacy, пост с известным legacy-хешем тоже считается
+    обработанным. Каждая таблица проверяется одним запросом на пачку из
+    _MAX_VARS значений.
+    """
+    unique = list(dict.fromkeys(f for f in fingerprints if f))
+    if not unique:
+        return []
+    with _lock:
+        conn = get_connection()
+        known = _select_known(
+            conn,
+            "SELECT fingerprint FROM processed WHERE fingerprint IN ({placeholders})",
+            unique,
+        )
+        if _legacy_present and legacy_hashes:
+            legacy_known = _select_known(
+                conn,
+                "SELECT message_hash FROM processed_legacy WHERE message_hash IN ({placeholders})",
+                list(dict.fromkeys(h for h in legacy_hashes if h)),
+            )
+            known.update(
+                f for f, h in zip(fingerprints, legacy_hashes) if h in legacy_known
+            )
+        return [f for f in unique if f not in known]
+
+
+def mark_processed(fingerprints: Iterable[bytes], commit: bool = True) -> None:
+    """Помечает отпечатки обработанными (INSERT OR IGNORE пачкой)."""
+    now = int(time.time())
+    rows = [(f, now) for f in fingerprints if f]
+    if not rows:
+        return
+    with _lock:
+        conn = get_connection()
+        conn.executemany(
+            "INSERT OR IGNORE INTO processed (fingerprint, first_seen) VALUES (?, ?)", rows
+        )
+        if commit:
+            conn.commit()
+
+
+def compact_processed(ttl_seconds: float, commit: bool = True) -> None:
+    """Удаляет отпечатки старше ttl_seconds; processed_legacy удаляется
+    целиком, когда с момента миграции прошло столько же.
+    """
+    global _legacy_present
+    with _lock:
+        conn = get_connection()
+        cutoff = int(time.time() - ttl_seconds)
+        conn.execute("DELETE FROM processed WHERE first_seen < ?", (cutoff,))
+        if _legacy_present:
+            row = conn.execute(
+                "SELECT value FROM registry_meta WHERE key='processed_legacy_since'"
+            ).fetchone()
+            if row is None or int(row[0]) < cutoff:
+                conn.execute("DROP TABLE processed_legacy")
+                conn.execute("DELETE FROM registry_meta WHERE key='processed_legacy_since'")
+                _legacy_present = False
+        if commit:
+            conn.commit()
+
+
+def buffer_posts(
+    rows: Iterable[Tuple[str, int, float, str]],
+    commit: bool = True,
+) -> None:
+    """Кладёт посты в буфер: (channel, message_id, unix-время, текст)."""
+    rows = list(rows)
+    if not rows:
+        return
+    with _lock:
+        conn = get_connection()
+        conn.executemany(
+            "INSERT OR IGNORE INTO posts (channel, message_id, posted_at, text) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        if commit:
+            conn.commit()
+
+
+def take_buffered_posts(since: float, until: float) -> List[Tuple[str, int, float, str]]:
+    """Возвращает невыданные посты за [since, until] в порядке публикации,
+    (channel, message_id, unix-время, текст), и помечает их выданными
+    (одной транзакцией).
+    """
+    with _lock:
+        conn = get_connection()
+        with conn:
+            rows = conn.execute(
+                """
+                SELECT id, channel, message_id, posted_at, text FROM posts
+                WHERE posted_at BETWEEN ? AND ? AND consumed_at IS NULL
+                ORDER BY posted_at
+                """,
+                (since, until),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE posts SET consumed_at = ? WHERE id = ?",
+                [(int(time.time()), row[0]) for row in rows],
+            )
+        return [row[1:] for row in rows]
+
+
+def prune_buffered_posts(before: float, commit: bool = True) -> None:
+    with _lock:
+        conn = get_connection()
+        conn.execute("DELETE FROM posts WHERE posted_at < ?", (before,))
+        if commit:
+            conn.commit()
+
+
+def get_channel_peers() -> Dict[str, Tuple[int, int]]:
+    """Return {channel: (peer_id, access_hash)} for all cached channels."""
+    with _lock:
+        cur = get_connection().execute(
+            "SELECT channel, peer_id, access_hash FROM channel_peers"
+        )
+        return {channel: (int(pid), int(ah)) for channel, pid, ah in cur.fetchall()}
+
+
+def save_channel_peer(channel: str, peer_id: int, access_hash: int) -> None:
+    with _lock:
+        conn = get_connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO channel_peers (channel, peer_id, access_hash) VALUES (?, ?, ?)",
+            (channel, int(peer_id), int(access_hash)),
+        )
+        conn.commit()
+
+
+def forget_channel_peer(channel: str) -> None:
+    """Сбрасывает кэш peer канала (после ошибки запроса)."""
+    with _lock:
+        conn = get_connection()
+        conn.execute("DELETE FROM channel_peers WHERE channel = ?", (channel,))
+        conn.commit()
+
+
+def get_watermarks() -> Dict[str, Tuple[int, Optional[str], Optional[str]]]:
+    """Return {channel: (last_message_id, iso_date, iso_window_start)} for
+    all known channels.
+    """
+    with _lock:
+        cur = get_connection().execute(
+            "SELECT channel, last_message_id, last_message_date, window_start FROM channel_watermarks"
+        )
+        return {
+            channel: (int(last_id), date, window_start)
+            for channel, last_id, date, window_start in cur.fetchall()
+        }
+
+
+def advance_watermarks(
+    marks: Dict[str, Tuple[int, Optional[str], Optional[str]]],
+    commit: bool = True,
+) -> None:
+    """Сдвигает водяные знаки вперёд: {channel: (message_id, iso_date,
+    iso_window_start)}, где window_start — начало окна, все сообщения
+    которого до message_id обработаны (None — без окна). Значение никогда
+    не уменьшается. При commit=False изменения остаются в текущей
+    транзакции вызывающего кода.
+    """
+    if not marks:
+        return
+    with _lock:
+        conn = get_connection()
+        conn.executemany(
+            """
+            INSERT INTO channel_watermarks(channel, last_message_id, last_message_date, window_start)
+            VALUES(?, ?, ?, ?)
+            ON CONFLICT(channel) DO UPDATE SET
+                last_message_id = excluded.last_message_id,
+                last_message_date = excluded.last_message_date,
+                window_start = excluded.window_start,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE excluded.last_message_id > channel_watermarks.last_message_id
+            """,
+            [
+                (channel, int(mid), date, window_start)
+                for channel, (mid, date, window_start) in marks.items()
+            ],
+        )
+        if commit:
+            conn.commit()
+
+
+def load_near_duplicates(values: Iterable[int], since: float) -> List[int]:
+    """Return stored SimHash values (since `since`, unix time) that share
+    at least one LSH bucket with any of `values`. Only the matching
+    buckets are read, not the whole history: bands are sized for
+    NEAR_DUP_MAX_DISTANCE (6 bands of 10-11 bits for distance 5), so a
+    bucket holds few unrelated hashes even with thousands stored.
+    """
+    buckets = sorted({b for v in values for b in _buckets(v)})
+    if not buckets:
+        return []
+    with _lock:
+        conn = get_connection()
+        found = set()
+        for i in range(0, len(buckets), _MAX_VARS):
+            chunk = buckets[i:i + _MAX_VARS]
+            placeholders = ",".join("?" * len(chunk))
+            cur = conn.execute(
+                f"""
+                SELECT DISTINCT i.simhash FROM near_dup_buckets b
+                JOIN near_dup_index i ON i.id = b.entry_id
+                WHERE b.bucket IN ({placeholders}) AND i.created_at >= ?
+                """,
+                (*chunk, int(since)),
+            )
+            found.update(to_unsigned(row[0]) for row in cur.fetchall())
+        return list(found)
+
+
+def add_near_duplicates(values: Iterable[int], commit: bool = True) -> None:
+    """Добавляет SimHash постов в индекс почти-дубликатов."""
+    with _lock:
+        conn = get_connection()
+        now = int(time.time())
+        for value in values:
+            cur = conn.execute(
+                "INSERT INTO near_dup_index (simhash, created_at) VALUES (?, ?)",
+                (to_signed(value), now),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO near_dup_buckets (bucket, entry_id) VALUES (?, ?)",
+                [(bucket, cur.lastrowid) for bucket in _buckets(value)],
+            )
+        if commit:
+            conn.commit()
+
+
+def prune_near_duplicates(before: float, commit: bool = True) -> None:
+    """Удаляет из индекса записи старше `before` (unix time)."""
+    with _lock:
+        conn = get_connection()
+        conn.execute(
+            """
+            DELETE FROM near_dup_buckets WHERE entry_id IN (
+                SELECT id FROM near_dup_index WHERE created_at < ?
+            )
+            """,
+            (int(before),),
+        )
+        conn.execute("DELETE FROM near_dup_index WHERE created_at < ?", (int(before),))
+        if commit:
+            conn.commit()
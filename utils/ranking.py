@@ -0,0 +1,75 @@
+# utils/ranking.py
+#
+# Общее для локальных ранжировщиков: разбиение текста на слова,
+# нормировка составляющих оценки, их веса и основы рыночных терминов.
+# numpy здесь не импортируется — функции работают с массивами, которые
+# передал вызывающий.
+
+import re
+from typing import Dict, List
+
+# Слова любого алфавита (русские посты, английские теги Pixabay)
+WORD_RE = re.compile(r"\w+")
+# Короче этого слова не участвуют в сравнении (предлоги, союзы)
+MIN_TERM_LEN = 3
+
+# Вес составляющих итоговой оценки постов (core.post_ranker)
+POST_WEIGHTS: Dict[str, float] = {
+    "centrality": 0.5,   # центральность TF-IDF в окне
+    "keywords": 0.3,     # рыночные термины, числа, имена
+    "recency": 0.2,      # свежесть
+}
+
+# Вес составляющих итоговой оценки обложек (core.cover_ranker)
+COVER_WEIGHTS: Dict[str, float] = {
+    "tags": 0.3,         # финансовые теги (оценка utils.tag_classifier)
+    "context": 0.3,      # совпадение тегов со словами промпта и запросов
+    "popularity": 0.2,   # лайки и скачивания на Pixabay
+    "resolution": 0.2,   # хватает ли разрешения рендишенам
+    # Штраф за тему, которая уже была среди последних обложек (умножается
+    # на её долю среди них)
+    "theme": -0.3,
+}
+
+# Основы терминов тем рынка (формат правил utils.ad_filter, русские и
+# английские): по ним core.cover_pool узнаёт тему текста
+THEME_STEMS: Dict[str, List[str]] = {
+    "oil": ["нефт*", "=brent", "=wti", "=opec", "опек*", "oil*", "газ*", "энергет*", "energy*"],
+    "gold": ["золот*", "gold*", "драгметалл*", "серебр*", "silver*", "bullion*"],
+    "central_banks": [
+        "=цб", "=фрс", "=ецб", "центробанк*", "ставк*", "инфляц*", "=fed", "=ecb",
+        "central bank*", "interest rate*", "inflation*", "monetary*",
+    ],
+    "equities": [
+        "акци*", "индекс*", "мосбирж*", "бирж*", "дивиденд*", "=ipo", "stock*",
+        "nasdaq*", "equit*", "dividend*", "wall street",
+    ],
+    "crypto": ["биткоин*", "крипт*", "блокчейн*", "bitcoin*", "crypto*", "blockchain*", "ethereum*"],
+    "currency": ["доллар*", "рубл*", "юан*", "валют*", "dollar*", "currenc*", "forex*", "ruble*", "yuan*"],
+}
+
+# Ключевые рыночные термины для оценки постов: все темы и основы вне тем
+MARKET_KEYWORDS = list(dict.fromkeys([
+    *(stem for stems in THEME_STEMS.values() for stem in stems),
+    "евро*", "облигац*", "отчетност*", "отчётност*", "выручк*", "прибыл*",
+    "=ввп", "санкц*", "экспорт*", "импорт*", "бюджет*", "fed*", "treasur*",
+    "yield*",
+]))
+
+
+def words(text: str) -> List[str]:
+    """Слова текста в нижнем регистре."""
+    return WORD_RE.findall((text or "").lower())
+
+
+def unit(values):
+    """Масштабирует неотрицательный массив к [0, 1] по максимуму."""
+    top = values.max() if values.size else 0.0
+    return values / top if top > 0 else values * 0.0
+
+
+def weighted_sum(weights: Dict[str, float], parts: Dict[str, object]):
+    """Итоговая оценка: сумма составляющих parts ({имя: массив}) с весами
+    weights (POST_WEIGHTS и т. п.).
+    """
+    return sum(weight * parts[name] for name, weight in weights.items())
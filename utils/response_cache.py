@@ -0,0 +1,123 @@
+# utils/response_cache.py
+#
+# Контентно-адресуемый кэш ответов внешних API в SQLite. Записи
+# разделены по пространствам имён (namespace), живут TTL секунд и
+# вытесняются по давности последнего чтения при превышении CACHE_MAX_MB.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from config.settings import CACHE_DB_PATH, CACHE_MAX_MB
+
+
+_conn: Optional[sqlite3.Connection] = None
+# Соединение общее для потоков (map-шаг сводки идёт в пуле потоков)
+_lock = threading.Lock()
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Отдельная база кэша (data/cache.db), чтобы не конкурировать за
+    запись с processed.db. Схема создаётся один раз.
+    """
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(CACHE_DB_PATH) or ".", exist_ok=True)
+        _conn = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS response_cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID;
+            """
+        )
+        _conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_response_cache_access ON response_cache(last_access)"
+        )
+        _conn.commit()
+    return _conn
+
+
+def make_key(payload: Any) -> str:
+    """SHA-256 канонического JSON: одинаковые параметры дают один ключ
+    независимо от порядка полей.
+    """
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cache_get(namespace: str, key: str) -> Optional[str]:
+    """Значение из кэша или None, если записи нет или истёк её TTL."""
+    now = time.time()
+    with _lock:
+        conn = _get_connection()
+        row = conn.execute(
+            "SELECT value, expires_at FROM response_cache WHERE namespace=? AND key=?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        with conn:
+            if expires_at < now:
+                conn.execute(
+                    "DELETE FROM response_cache WHERE namespace=? AND key=?", (namespace, key)
+                )
+                return None
+            conn.execute(
+                "UPDATE response_cache SET last_access=? WHERE namespace=? AND key=?",
+                (now, namespace, key),
+            )
+    return value
+
+
+def cache_put(namespace: str, key: str, value: str, ttl_seconds: float) -> None:
+    """Сохраняет значение на ttl_seconds и, если кэш превысил
+    CACHE_MAX_MB, вытесняет давно не использованные записи (LRU).
+    """
+    now = time.time()
+    size = len(value.encode("utf-8")) + len(key)
+    with _lock, _get_connection() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO response_cache
+                (namespace, key, value, size, created_at, expires_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (namespace, key, value, size, now, now + ttl_seconds, now),
+        )
+        _evict(conn, now)
+
+
+def _evict(conn: sqlite3.Connection, now: float) -> None:
+    conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+    budget = CACHE_MAX_MB * 1024 * 1024
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+    if total <= budget:
+        return
+    # Удаляем самые давно использованные, пока не уложимся в бюджет
+    freed = 0
+    victims = []
+    for namespace, key, size in conn.execute(
+        "SELECT namespace, key, size FROM response_cache ORDER BY last_access"
+    ):
+        victims.append((namespace, key))
+        freed += size
+        if total - freed <= budget:
+            break
+    conn.executemany(
+        "DELETE FROM response_cache WHERE namespace=? AND key=?", victims
+    )
@@ -0,0 +1,109 @@
+# utils/simhash.py
+
+import hashlib
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.hash_utils import normalize_text
+
+
+BITS = 64
+# Порог, под который строятся полосы, если он не задан: 8 полос по 8 бит
+DEFAULT_MAX_DISTANCE = 7
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _features(text: str) -> List[str]:
+    """Слова и пары соседних слов без ссылок, упоминаний, эмодзи и
+    пунктуации.
+    """
+    words = _WORD_RE.findall(normalize_text(text).lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-битный SimHash текста или None, если в тексте нет слов."""
+    features = _features(text)
+    if not features:
+        return None
+    weights = [0] * BITS
+    for feature in features:
+        h = _feature_hash(feature)
+        for bit in range(BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+@lru_cache(maxsize=None)
+def band_widths(max_distance: int = DEFAULT_MAX_DISTANCE) -> Tuple[int, ...]:
+    """Ширины LSH-полос под порог max_distance: max_distance + 1 полос
+    почти равной ширины. По принципу Дирихле два хеша на расстоянии
+    <= max_distance обязательно совпадают хотя бы в одной полосе, а чем
+    полосы шире, тем меньше в корзине случайных кандидатов.
+    """
+    count = min(BITS, max(1, max_distance + 1))
+    base, extra = divmod(BITS, count)
+    return tuple(base + 1 if i < extra else base for i in range(count))
+
+
+def bands(value: int, max_distance: int = DEFAULT_MAX_DISTANCE) -> Tuple[int, ...]:
+    """Разбивает хеш на ключи LSH-корзин (по полосе band_widths)."""
+    keys = []
+    shift = 0
+    for width in band_widths(max_distance):
+        keys.append((value >> shift) & ((1 << width) - 1))
+        shift += width
+    return tuple(keys)
+
+
+def to_signed(value: int) -> int:
+    """uint64 -> int64 для хранения в SQLite INTEGER."""
+    return value - (1 << BITS) if value >= 1 << (BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << BITS) if value < 0 else value
+
+
+class SimHashIndex:
+    """Индекс в памяти: LSH-корзины по полосам, поиск проверяет только
+    хеши из тех же корзин, а не все подряд. Полосы строятся под
+    max_distance при создании (band_widths): поиск полон, пока порог не
+    поднят выше него.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE, values: Iterable[int] = ()):
+        self.max_distance = max_distance
+        # Порог, под который построены полосы
+        self.band_distance = max_distance
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in band_widths(max_distance)]
+        for value in values:
+            self.add(value)
+
+    def add(self, value: int) -> None:
+        for i, key in enumerate(bands(value, self.band_distance)):
+            self._buckets[i].setdefault(key, []).append(value)
+
+    def find(self, value: int) -> Optional[int]:
+        """Ближайший известный хеш на расстоянии <= max_distance или None."""
+        for i, key in enumerate(bands(value, self.band_distance)):
+            for other in self._buckets[i].get(key, ()):
+                if hamming(value, other) <= self.max_distance:
+                    return other
+        return None
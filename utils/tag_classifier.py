@@ -0,0 +1,186 @@
+# utils/tag_classifier.py
+#
+# Классификатор тегов Pixabay для отбора обложек. Словари (финансовые
+# термины с весами и чёрный список) читаются из IMAGE_TAGS_PATH и
+# компилируются один раз: однословные термины ищутся в словаре по
+# токену, многословные — по дереву фраз (первое слово -> следующее ...).
+# Строка тегов разбивается на слова без регулярок; термины находятся
+# одним пересечением множеств, дерево фраз обходится только если в
+# тегах есть первое слово какой-нибудь фразы.
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from config.settings import IMAGE_TAGS_PATH
+
+
+# Используются, если файл со словарями отсутствует
+DEFAULT_FINANCE: Dict[str, float] = {
+    "finance": 1, "financial": 1, "stock": 1.5, "stock market": 2, "market": 1,
+    "trading": 1.5, "trader": 1.5, "chart": 1, "candlestick": 2, "ticker": 1.5,
+    "forex": 2, "exchange": 1, "economy": 1, "economic": 1, "bank": 1,
+    "banking": 1, "money": 1, "investment": 1, "invest": 1, "investing": 1,
+    "gold": 1, "oil": 1, "commodity": 1, "energy": 0.5, "currency": 1,
+    "currencies": 1, "dollar": 1, "cash": 1, "banknote": 1, "crypto": 1.5,
+    "cryptocurrency": 1.5, "cryptocurrencies": 1.5, "bitcoin": 1.5,
+    "blockchain": 1, "wall street": 2, "bull": 0.5, "bear": 0.5, "etf": 2,
+}
+DEFAULT_BLACKLIST: List[str] = [
+    "power supply", "psu", "computer", "motherboard", "gpu", "cpu",
+    "cable", "plug", "socket", "server", "electronics",
+    "mushroom", "forest", "tree", "leaf", "leaves", "flower", "bloom",
+    "mountain", "landscape", "river", "lake", "sea", "ocean", "nature",
+    "butterfly", "insect", "animal", "bird", "cat", "dog", "doge",
+    "squirrel", "deer", "fox", "horse",
+]
+
+_QUERY_TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+
+# Вид термина в словаре: финансовый или из чёрного списка
+FINANCE, BLACKLIST = "finance", "blacklist"
+
+# Ключ конца фразы в дереве (токены пустыми не бывают)
+_END = ""
+
+
+def _forms(token: str) -> Tuple[str, str]:
+    """Формы слова словаря: как записано и с окончанием -s."""
+    return token, token + "s"
+
+
+def _tokens(text: str) -> List[str]:
+    """Слова тегов Pixabay ("stock market, chart"). Запятая — отдельный
+    токен: на ней обрывается фраза (граница тега); дефис разделяет слова
+    ("crypto-currency", "wall-street"), как и в запросах.
+    """
+    return text.lower().replace(",", " , ").replace("-", " ").split()
+
+
+def load_vocab(path: Optional[str] = None) -> Tuple[Dict[str, float], List[str]]:
+    """Читает словари из файла: секции [finance] («термин [вес]») и
+    [blacklist] (по термину на строку, # — комментарий).
+    """
+    try:
+        with open(path or IMAGE_TAGS_PATH, encoding="utf-8") as f:
+            lines = [line.strip() for line in f]
+    except FileNotFoundError:
+        return dict(DEFAULT_FINANCE), list(DEFAULT_BLACKLIST)
+    finance: Dict[str, float] = {}
+    blacklist: List[str] = []
+    section = None
+    for line in lines:
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1].strip().lower()
+            continue
+        if section == FINANCE:
+            term, _, weight = line.rpartition(" ")
+            try:
+                finance[term.strip()] = float(weight)
+            except ValueError:
+                finance[line] = 1.0
+        elif section == BLACKLIST:
+            blacklist.append(line)
+    return finance, blacklist
+
+
+class TagMatch(NamedTuple):
+    # Сумма весов найденных финансовых терминов (каждый учитывается раз)
+    score: float
+    finance: Tuple[str, ...]
+    # Первый найденный термин чёрного списка
+    blocked: Optional[str]
+
+
+class TagClassifier:
+    """Оценка строки тегов по финансовому словарю и чёрному списку."""
+
+    def __init__(self, finance: Dict[str, float], blacklist: Iterable[str]):
+        self._words: Dict[str, Tuple[str, str, float]] = {}
+        self._phrases: dict = {}
+        for term, weight in finance.items():
+            self._add(term, (FINANCE, term, float(weight)))
+        for term in blacklist:
+            self._add(term, (BLACKLIST, term, 0.0))
+        # Все слова, с которых может начаться термин, — одно пересечение
+        self._heads = frozenset(self._words) | frozenset(self._phrases)
+        # Строки тегов в выдаче Pixabay часто повторяются
+        self.match = lru_cache(maxsize=4096)(self._match)
+
+    def _add(self, term: str, entry: Tuple[str, str, float]) -> None:
+        tokens = [t.lower() for t in _QUERY_TOKEN_RE.findall(term)]
+        if not tokens:
+            return
+        if len(tokens) == 1:
+            for form in _forms(tokens[0]):
+                self._words[form] = entry
+            return
+        # Ветки дерева на обе формы каждого слова фразы
+        nodes = [self._phrases]
+        for token in tokens:
+            nodes = [node.setdefault(form, {}) for node in nodes for form in _forms(token)]
+        for node in nodes:
+            node[_END] = entry
+
+    def _scan(self, tokens: List[str]):
+        """(начало, конец, запись) каждого термина в последовательности токенов."""
+        for i, token in enumerate(tokens):
+            entry = self._words.get(token)
+            if entry is not None:
+                yield i, i + 1, entry
+            node = self._phrases.get(token)
+            j = i + 1
+            while node:
+                if _END in node:
+                    yield i, j, node[_END]
+                if j == len(tokens):
+                    break
+                node = node.get(tokens[j])
+                j += 1
+
+    def _match(self, text: str) -> TagMatch:
+        tokens = _tokens(text or "")
+        heads = self._heads.intersection(tokens)
+        if not heads:
+            return TagMatch(0.0, (), None)
+        if heads.isdisjoint(self._phrases):
+            entries = [self._words[t] for t in sorted(heads)]
+        else:
+            entries = [entry for _, _, entry in self._scan(tokens)]
+        finance: Dict[str, float] = {}
+        blocked = None
+        for kind, term, weight in entries:
+            if kind == FINANCE:
+                finance.setdefault(term, weight)
+            elif blocked is None:
+                blocked = term
+        return TagMatch(float(sum(finance.values())), tuple(finance), blocked)
+
+    def strip_blacklisted(self, query: str) -> str:
+        """Вырезает из запроса термины чёрного списка (регистр и прочие
+        слова сохраняются).
+        """
+        found = list(_QUERY_TOKEN_RE.finditer(query or ""))
+        tokens = [m.group(0).lower() for m in found]
+        cuts = [
+            (found[start].start(), found[end - 1].end())
+            for start, end, (kind, _, _) in self._scan(tokens)
+            if kind == BLACKLIST
+        ]
+        if not cuts:
+            return query
+        parts, pos = [], 0
+        for start, end in sorted(cuts):
+            if start >= pos:
+                parts.append(query[pos:start])
+            pos = max(pos, end)
+        parts.append(query[pos:])
+        return re.sub(r"\s+", " ", "".join(parts)).strip()
+
+
+@lru_cache(maxsize=1)
+def get_tag_classifier() -> TagClassifier:
+    """Классификатор по IMAGE_TAGS_PATH (собирается один раз)."""
+    return TagClassifier(*load_vocab())